@@ -0,0 +1,48 @@
+# Benchmark for tlexer on pathological input: how lexing time grows with
+# input size for each engine. The regex engine should scale linearly; the
+# ply engine (the reference implementation) does not, so it is only run on
+# sizes small enough to finish.
+
+# I m p o r t s
+
+import time
+
+import abnormal.tlexer as tlexer
+from abnormal.exceptions import SqlError
+
+# V a r i a b l e s
+
+# Name, query generator, sizes to try with ply, sizes to try with regex.
+CASES = [
+    ("unterminated backslashes", lambda n: "select '" + "\\\\" * n,
+        [ 8, 12, 16 ], [ 10_000, 100_000, 1_000_000 ]),
+    ("unterminated escaped quotes", lambda n: "select '" + "\\'" * n,
+        [ 1_000, 10_000 ], [ 10_000, 100_000, 1_000_000 ]),
+    ("open comments", lambda n: "select " + "/* " * n,
+        [ 1_000, 10_000 ], [ 10_000, 100_000, 1_000_000 ]),
+    ("huge literal", lambda n: "select '" + "x" * n + "'",
+        [ 100_000, 1_000_000 ], [ 1_000_000, 10_000_000 ]),
+]
+
+# F u n c t i o n s
+
+def lex(query, engine):
+    start = time.perf_counter()
+    try:
+        for token in tlexer.tlexer(query, engine):
+            pass
+    except SqlError:
+        pass
+    return time.perf_counter() - start
+
+# M a i n   P r o g r a m
+
+if __name__ == '__main__':
+    for name, make, ply_sizes, regex_sizes in CASES:
+        print(name)
+        for engine, sizes in [ ("ply", ply_sizes), ("regex", regex_sizes) ]:
+            for size in sizes:
+                query = make(size)
+                elapsed = lex(query, engine)
+                per_char = elapsed / len(query) * 1e9
+                print(f"{engine:>8} {len(query):>10} chars: {elapsed:9.4f} s {per_char:9.1f} ns/char")
@@ -0,0 +1,52 @@
+# Benchmark for columnar results: the memory and time taken to hold a
+# numeric result set as one object per row, as lists and as typed arrays.
+
+# I m p o r t s
+
+from dataclasses import dataclass
+import sqlite3
+import time
+import tracemalloc
+
+import abnormal
+
+# V a r i a b l e s
+
+NROWS = 1_000_000
+
+# C l a s s e s
+
+@dataclass
+class Reading:
+    id: int
+    sensor: int
+    value: float
+
+# F u n c t i o n s
+
+def measure(fetch):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fetch()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return elapsed, size
+
+# M a i n   P r o g r a m
+
+if __name__ == '__main__':
+    conn = abnormal.connect(sqlite3, ":memory:")
+    conn.execute("create table readings ( id integer primary key, sensor integer, value real )")
+    conn.executemany("insert into readings (id, sensor, value) values (:id, :sensor, :value)",
+        ({ 'id': i, 'sensor': i % 100, 'value': i / 7 } for i in range(NROWS)))
+    query = "select id, sensor, value from readings"
+    print(f"{NROWS} rows")
+    for name, fetch in [
+            ("dataclasses", lambda: list(conn.execute(query).into(Reading))),
+            ("list columns", lambda: conn.execute(query).into_columns()),
+            ("typed columns", lambda: conn.execute(query).into_columns(typed=True)) ]:
+        elapsed, size = measure(fetch)
+        print(f"{name:>14}: {elapsed:7.3f} s, {size / 1e6:8.1f} MB")
+    conn.close()
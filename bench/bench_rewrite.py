@@ -0,0 +1,71 @@
+# Benchmark for executemany with and without insert rewriting, against a
+# fake connector that, like many real ones, implements executemany as a
+# loop of execute calls, each costing a (simulated) network round trip.
+
+# I m p o r t s
+
+import time
+
+import abnormal
+from abnormal.driver import StandardDriver
+
+# V a r i a b l e s
+
+# Simulated round trip time, in seconds.
+LATENCY = 0.0005
+
+ROWS = [ { 'sno': i, 'name': f"Smith {i}", 'status': 20, 'city': "London" } for i in range(5000) ]
+QUERY = "insert into suppliers (sno, name, status, city) values (:sno, :name, :status, :city)"
+
+# C l a s s e s
+
+class FakeCursor:
+    description = None
+    rowcount = -1
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, operation, parameters=()):
+        self.connection.statements += 1
+        time.sleep(LATENCY)
+
+    def executemany(self, operation, seq_of_parameters):
+        for parameters in seq_of_parameters:
+            self.execute(operation, parameters)
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+# F u n c t i o n s
+
+def run(rewrite):
+    raw = FakeConnection()
+    conn = abnormal.Connection(raw, "qmark", StandardDriver("table_schema", "database()"), rewrite_inserts=rewrite)
+    start = time.perf_counter()
+    conn.executemany(QUERY, ROWS)
+    return time.perf_counter() - start, raw.statements
+
+# M a i n   P r o g r a m
+
+if __name__ == '__main__':
+    print(f"{len(ROWS)} rows, {LATENCY * 1000:.1f} ms per round trip")
+    for rewrite in [ False, True ]:
+        elapsed, statements = run(rewrite)
+        print(f"rewrite_inserts={rewrite!s:<5} {statements:>6} statements: {elapsed:9.4f} s")
@@ -0,0 +1,83 @@
+# Benchmark for turning result rows into objects: the compiled row
+# factories used by into, against building keyword arguments for each row
+# as into used to, and the memory taken by wide rows as each kind of
+# object.
+
+# I m p o r t s
+
+from dataclasses import dataclass
+from typing import NamedTuple
+import time
+import tracemalloc
+
+from abnormal import mapping, namespace, record, scalar
+from abnormal.rows import row_factory
+
+# V a r i a b l e s
+
+NROWS = 1_000_000
+COLNAMES = ("sno", "name", "status", "city")
+ROWS = [ (i, f"Smith {i}", 20, "London") for i in range(NROWS) ]
+
+WIDE_NROWS = 100_000
+WIDE_COLNAMES = tuple([ f"column_{i}" for i in range(50) ])
+WIDE_ROWS = [ tuple(range(i, i + 50)) for i in range(WIDE_NROWS) ]
+
+# C l a s s e s
+
+@dataclass
+class Supplier:
+    sno: int
+    name: str
+    status: int
+    city: str
+
+class SupplierTuple(NamedTuple):
+    sno: int
+    name: str
+    status: int
+    city: str
+
+# F u n c t i o n s
+
+def keyword_convert(colnames, target, row):
+    "How conversion used to work: keyword arguments, built column by column."
+    kwargs = {}
+    col = 0
+    for colname in colnames:
+        kwargs[colname] = row[col]
+        col += 1
+    return target(**kwargs)
+
+def memory(convert, rows):
+    tracemalloc.start()
+    result = [ convert(row) for row in rows ]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+def timed(convert, rows):
+    start = time.perf_counter()
+    for row in rows:
+        convert(row)
+    return time.perf_counter() - start
+
+# M a i n   P r o g r a m
+
+if __name__ == '__main__':
+    print(f"{NROWS} rows")
+    for name, target, colnames, rows in [
+            ("dataclass", Supplier, COLNAMES, ROWS),
+            ("NamedTuple", SupplierTuple, COLNAMES, ROWS),
+            ("mapping", mapping, COLNAMES, ROWS),
+            ("namespace", namespace, COLNAMES, ROWS),
+            ("record", record, COLNAMES, ROWS),
+            ("scalar", scalar, COLNAMES[:1], [ x[:1] for x in ROWS ]) ]:
+        old = timed(lambda row: keyword_convert(colnames, target, row), rows)
+        new = timed(row_factory(colnames, target), rows)
+        print(f"{name:>10}: keywords {old:7.3f} s, compiled {new:7.3f} s, {old / new:5.1f}x")
+    print(f"{WIDE_NROWS} rows of {len(WIDE_COLNAMES)} columns")
+    for name, target in [ ("mapping", mapping), ("namespace", namespace), ("record", record) ]:
+        size = memory(row_factory(WIDE_COLNAMES, target), WIDE_ROWS)
+        print(f"{name:>10}: {size / 1e6:7.1f} MB")
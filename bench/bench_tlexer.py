@@ -0,0 +1,67 @@
+# Benchmark for tlexer: per-call lexing cost on the test_tlexer corpus.
+
+# I m p o r t s
+
+import re
+import timeit
+
+import abnormal.tlexer as tlexer
+from abnormal.ply import lex
+
+# V a r i a b l e s
+
+# The queries exercised by tests/test_tlexer.py.
+CORPUS = [
+    "select * from suppliers",
+    "select\t* from suppliers",
+    "select  * from suppliers",
+    "select\n* from suppliers",
+    "select\r\n* from suppliers",
+    "select-- a comment\n* from suppliers",
+    "select -- comment with space before\n* from suppliers",
+    "select/* C-style comment */* from suppliers",
+    "select /* C-style with spaces */ * from suppliers",
+    "insert into suppliers (sno, sname, status, city) values (:sno, :sname, :status, :city)",
+    "select * from suppliers where sno = :sno",
+    "insert into suppliers (sno, sname) values ('s1', ':starts_with_colon')",
+    "insert into suppliers (sno, sname) values (en_US's1', en_CA':starts_with_colon')",
+    r"select * from suppliers where sname = 'O''Rourke' || sname = 'O\'Brien'",
+    "select * from `suppliers`",
+    r"select * from ```suppliers\``",
+    'select * from "suppliers"',
+    r'select * from "\"suppliers"""',
+    "select * from suppliers where sname <> 'O''Rourke' || sname <= 'O''Brien'",
+]
+
+ROUNDS = 200
+
+# F u n c t i o n s
+
+def fresh_lexer_per_call():
+    "What tlexer used to do: build a whole new PLY lexer for each query."
+    for query in CORPUS:
+        lexer = lex.lex(module=tlexer, reflags=re.UNICODE | re.VERBOSE)
+        lexer.input(query)
+        while lexer.token():
+            pass
+
+def engine(name):
+    def run():
+        for query in CORPUS:
+            for token in tlexer.tlexer(query, name):
+                pass
+    return run
+
+def report(name, func, rounds):
+    elapsed = min(timeit.repeat(func, number=rounds, repeat=3))
+    per_query = elapsed / (rounds * len(CORPUS)) * 1e6
+    print(f"{name:>24}: {per_query:9.2f} us/query")
+    return per_query
+
+# M a i n   P r o g r a m
+
+if __name__ == '__main__':
+    before = report("fresh lexer per call", fresh_lexer_per_call, ROUNDS // 10)
+    for name in tlexer._ENGINES:
+        after = report(f"tlexer, {name} engine", engine(name), ROUNDS)
+        print(f"{'speedup':>24}: {before / after:9.1f}x")
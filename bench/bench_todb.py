@@ -0,0 +1,91 @@
+# Benchmark for query conversion on large generated SQL: wide inserts and
+# long IN lists.
+
+# I m p o r t s
+
+from collections.abc import Mapping
+from dataclasses import make_dataclass
+import timeit
+import tracemalloc
+
+import abnormal.tlexer as tlexer
+from abnormal import todb
+
+# V a r i a b l e s
+
+COLUMNS = [ f"column_{i}" for i in range(200) ]
+WIDE_INSERT = "insert into wide (" + ", ".join(COLUMNS) + ") values (" + \
+    ", ".join([ ':' + x for x in COLUMNS ]) + ")"
+IN_LIST = "select * from suppliers where sno in (" + \
+    ", ".join([ f"'s{i}'" for i in range(1000) ]) + ") and city = :city"
+
+ROUNDS = 50
+
+# For binding: a 20-parameter insert and data sources to feed it.
+BIND_COLUMNS = COLUMNS[:20]
+BIND_QUERY = "insert into wide (" + ", ".join(BIND_COLUMNS) + ") values (" + \
+    ", ".join([ ':' + x for x in BIND_COLUMNS ]) + ")"
+BIND_MAPPING = { x: i for i, x in enumerate(BIND_COLUMNS) }
+BIND_OBJECT = make_dataclass("Wide", BIND_COLUMNS)(*range(len(BIND_COLUMNS)))
+BIND_ROUNDS = 20000
+
+# F u n c t i o n s
+
+def token_convert(query):
+    "How conversion used to work: join a string back up from tokens."
+    rquery = []
+    rnames = []
+    for token in tlexer.tlexer(query):
+        if token.is_param:
+            rquery.append('?')
+            rnames.append(token.value[1:])
+        else:
+            rquery.append(token.value)
+    return todb.CacheValue(rquery, rnames)
+
+def span_convert(query):
+    return todb._positional(query, '?')
+
+def loop_bind(cached, params, container):
+    "How binding used to work: one lookup per name, per call."
+    ret = container()
+    for name in cached.names:
+        value = params[name] if isinstance(params, Mapping) else getattr(params, name)
+        if container is list:
+            ret.append(value)
+        elif name not in ret:
+            ret[name] = value
+    return ret
+
+def report_bind(paramstyle, container):
+    cached = todb._CONVERTERS[paramstyle](BIND_QUERY)
+    for label, params in [ ("mapping", BIND_MAPPING), ("object", BIND_OBJECT) ]:
+        assert loop_bind(cached, params, container) == cached.bind(params)
+        before = min(timeit.repeat(lambda: loop_bind(cached, params, container), number=BIND_ROUNDS, repeat=3))
+        after = min(timeit.repeat(lambda: cached.bind(params), number=BIND_ROUNDS, repeat=3))
+        print(f"{paramstyle + ', ' + label:>16}: {before / BIND_ROUNDS * 1e6:6.2f} us looped, "
+            f"{after / BIND_ROUNDS * 1e6:6.2f} us compiled")
+
+def peak(func, query):
+    tracemalloc.start()
+    func(query)
+    ret = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return ret
+
+def report(name, func, query):
+    elapsed = min(timeit.repeat(lambda: func(query), number=ROUNDS, repeat=3)) / ROUNDS
+    print(f"{name:>16}: {elapsed * 1e3:8.3f} ms, {peak(func, query) / 1024:8.1f} KiB peak")
+
+# M a i n   P r o g r a m
+
+if __name__ == '__main__':
+    assert token_convert(WIDE_INSERT).sql == span_convert(WIDE_INSERT).sql
+    assert token_convert(IN_LIST).sql == span_convert(IN_LIST).sql
+    for label, query in [ ("wide insert", WIDE_INSERT), ("long IN list", IN_LIST) ]:
+        print(f"{label} ({len(query)} chars)")
+        report("tokens", token_convert, query)
+        report("spans", span_convert, query)
+    print(f"binding {len(BIND_COLUMNS)} parameters")
+    report_bind("qmark", list)
+    report_bind("named", dict)
@@ -2,16 +2,24 @@
 
 # I m p o r t s
 
-from collections.abc import Iterator as _Iterator, Mapping as _Mapping, Sequence as _Sequence
+from collections.abc import Iterable as _Iterable, Iterator as _Iterator, Mapping as _Mapping, Sequence as _Sequence
+from itertools import batched as _batched, chain as _chain
 from typing import Any as _Any, Callable as _Callable, Optional as _Optional, Unpack as _Unpack
 from types import ModuleType as _ModuleType
 
+from .arrays import numpy_columns as _numpy_columns, numpy_records as _numpy_records, require_numpy as _require_numpy
 from .base import ConnectionBase as _ConnectionBase, CursorBase as _CursorBase, Target as _Target, PendingOperationBase as _PendingOperationBase
+from .batch import MultiRowInsert as _MultiRowInsert, simple_insert as _simple_insert
+from .columns import build_columns as _build_columns, Columns
 from .driver import driver_for as _driver_for, Driver
-from .exceptions import Error, IncompleteDataError, InterfaceError, InvalidStateError, SqlError, UnexpectedResultError
+from .exceptions import Error, IncompleteDataError, InterfaceError, InvalidStateError, LoadError, NotSupportedError, SqlError, UnexpectedResultError
 from .misc import Namespace
-from .pending import InsertOperation, UpdateOperation
-from .todb import QueryConverter as _QueryConverter
+from .parallel import parallel_load, WorkerStats
+from .pending import BulkLoadOperation, InsertOperation, MergeOperation, UpdateOperation
+from .prepared import PreparedQuery
+from .registry import load_queries, QueryRegistry
+from .rows import identity as _identity, mapping, namespace, record, row_factory as _row_factory, scalar, sequence
+from .todb import QueryCache, QueryConverter as _QueryConverter
 
 # V a r i a b l e s
 
@@ -26,16 +34,36 @@ apilevel = "2.0"
 threadsafety = 2
 paramstyle = "named"
 
+# The most rows into fetches at a time, unless told otherwise.
+_MAX_FETCH = 1024
+
+# Parameter sets handed at a time to connectors that will not take an
+# iterator, unless told otherwise.
+_CHUNK_SIZE = 10000
+
 # C l a s s e s
 
 class Connection(_ConnectionBase):
-    def __init__(self, raw: _Any, paramstyle: str, driver: Driver) -> None:
+    def __init__(self, raw: _Any, paramstyle: str, driver: Driver, cache: _Optional[QueryCache] = None,
+            rewrite_inserts: bool = False) -> None:
         for name in ['close', 'commit', 'rollback', 'cursor']:
             if not callable(getattr(raw, name, None)):
                 raise TypeError("Passed object is not a connection.")
         self.raw = raw
         self._paramstyle = paramstyle
         self._driver = driver
+        # Shared by all cursors on this connection.
+        self._converter = _QueryConverter(cache)
+        # Whether executemany turns simple inserts into multi-row ones.
+        self.rewrite_inserts = rewrite_inserts
+
+    @property
+    def query_cache(self) -> QueryCache:
+        return self._converter._qcache
+
+    @query_cache.setter
+    def query_cache(self, cache: QueryCache) -> None:
+        self._converter._qcache = cache
 
     def close(self) -> None:
         self.raw.close()
@@ -52,9 +80,13 @@ class Connection(_ConnectionBase):
     def execute(self, query: str, params: _Any = {}) -> _CursorBase:
         return self.cursor().execute(query, params)
 
-    def executemany(self, query: str, seq: _Sequence) -> None:
+    def executemany(self, query: str, seq: _Iterable, chunk_size: _Optional[int] = None) -> None:
         cursor = self.cursor()
-        cursor.executemany(query, seq)
+        cursor.executemany(query, seq, chunk_size)
+
+    def executemany_columns(self, query: str, columns: _Mapping[str, _Any], chunk_size: _Optional[int] = None) -> None:
+        cursor = self.cursor()
+        cursor.executemany_columns(query, columns, chunk_size)
 
     def insert_into(self, table: str) -> _PendingOperationBase:
         return self.cursor().insert_into(table)
@@ -62,12 +94,23 @@ class Connection(_ConnectionBase):
     def update(self, table: str) -> _PendingOperationBase:
         return self.cursor().update(table)
 
+    def merge_into(self, table: str) -> _PendingOperationBase:
+        return self.cursor().merge_into(table)
+
+    def bulk_load(self, table: str, rows: _Iterable[_Any], batch_size: _Optional[int] = None) -> list[int]:
+        return self.cursor().bulk_load(table, rows, batch_size)
+
+    def prepare(self, query: str) -> PreparedQuery:
+        return PreparedQuery(self, query, self._converter.compile(query, self._paramstyle))
+
 class Cursor(_CursorBase):
     def __init__(self, raw, connection) -> None:
         self.raw = raw
         self.connection = connection
         self._colnames: _Optional[_Sequence[str]] = None
-        self._converter = _QueryConverter()
+        self._converter = connection._converter
+        # The total for rewritten inserts, which span several statements.
+        self._rowcount: _Optional[int] = None
 
     @property
     def arraysize(self) -> int:
@@ -79,6 +122,8 @@ class Cursor(_CursorBase):
 
     @property
     def rowcount(self) -> int:
+        if self._rowcount is not None:
+            return self._rowcount
         return self.raw.rowcount
 
     def callproc(self, procname: str, params: _Optional[_Sequence[_Any]] = None) -> _Sequence[_Any]:
@@ -95,7 +140,14 @@ class Cursor(_CursorBase):
             self.raw.__del__()
 
     def execute(self, operation: str, params={}) -> _CursorBase:
-        self.raw.execute(*self._converter.convert(operation, params, self.connection._paramstyle))
+        return self._execute(*self._converter.convert(operation, params, self.connection._paramstyle))
+
+    def _execute(self, sql: str, params: _Any, prepare: bool = False) -> _CursorBase:
+        self._rowcount = None
+        if prepare:
+            self.connection._driver.execute_prepared(self.raw, sql, params)
+        else:
+            self.raw.execute(sql, params)
         descr = self.raw.description
         if descr is None:
             self._colnames = []
@@ -103,12 +155,50 @@ class Cursor(_CursorBase):
             self._colnames = [ x[0].lower() for x in descr ]
         return self
 
-    def executemany(self, operation: str, seq: _Sequence[_Any]) -> None:
-        # TODO: see if we can make this sequence evaluation lazy (should we?)
-        rseq = [ self._converter.convert(operation, params, self.connection._paramstyle) for params in seq ]
-        if rseq:
-            self.raw.executemany(rseq[0][0], [ x[1] for x in rseq ])
+    def executemany(self, operation: str, seq: _Iterable[_Any], chunk_size: _Optional[int] = None) -> None:
+        if self.connection.rewrite_inserts:
+            insert = _simple_insert(operation)
+            if insert is not None:
+                # Statement size bounds the rows in memory; a chunk size
+                # bounds it further.
+                if chunk_size is not None and chunk_size < 1:
+                    raise ValueError(f"invalid chunk size {chunk_size}")
+                self._colnames = []
+                self._rowcount = None
+                self._rowcount = _MultiRowInsert(self, *insert, max_rows=chunk_size)(seq)
+                return
+        cached = self._converter.compile(operation, self.connection._paramstyle)
+        self._executemany(cached.sql, map(cached.bind, seq), chunk_size)
+
+    def executemany_columns(self, operation: str, columns: _Mapping[str, _Any], chunk_size: _Optional[int] = None) -> None:
+        cached = self._converter.compile(operation, self.connection._paramstyle)
+        self._executemany(cached.sql, cached.bind_columns(columns), chunk_size)
+
+    # Parameter sets are converted as they are consumed. Given a chunk
+    # size, they go to the connector that many at a time, as lists, and
+    # rowcount is the total; otherwise all at once, as an iterator, if the
+    # connector will take one, else _CHUNK_SIZE at a time.
+    def _executemany(self, sql: str, seq: _Iterable[_Any], chunk_size: _Optional[int] = None) -> None:
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError(f"invalid chunk size {chunk_size}")
         self._colnames = []  # results not allowed here
+        self._rowcount = None
+        it = iter(seq)
+        # Many connectors balk at being given nothing to do.
+        for first in it:
+            break
+        else:
+            return
+        it = _chain([first], it)
+        if chunk_size is None and self.connection._driver.lazy_executemany:
+            self.raw.executemany(sql, it)
+            return
+        total = 0
+        for chunk in _batched(it, chunk_size or _CHUNK_SIZE):
+            self.raw.executemany(sql, list(chunk))
+            rowcount = self.raw.rowcount
+            total = -1 if total < 0 or rowcount < 0 else total + rowcount
+        self._rowcount = total
 
     def fetchone(self) -> _Optional[_Sequence[_Any]]:
         return self.raw.fetchone()
@@ -134,11 +224,51 @@ class Cursor(_CursorBase):
             self.raw.setoutputsize(size, column)
 
     def into(self, target: _Target) -> _Iterator[_Any]:
+        for batch in self.into_batches(target):
+            yield from batch
+
+    def into_batches(self, target: _Target, size: _Optional[int] = None) -> _Iterator[list[_Any]]:
+        """
+        Like into, but yield lists of converted rows, one per block fetched.
+        Without a size, blocks start at arraysize rows (so the first rows
+        arrive promptly) and double with each full block, up to a limit.
+        """
+        convert = self._row_factory(target)
+        for rows in self._blocks(size):
+            yield list(rows) if convert is _identity else [ convert(row) for row in rows ]
+
+    def into_columns(self, typed: bool = False) -> Columns:
+        """
+        Return all remaining rows as columns, mapping each column name to
+        a list of its values. If typed, integer and floating point columns
+        are arrays instead, with nulls noted in the result's nulls masks.
+        Column names must be unique, else InterfaceError is raised.
+        """
+        assert self._colnames is not None
+        return _build_columns(self._colnames, self._blocks(None), typed)
+
+    def into_numpy(self, dtype: _Any = None, columns: bool = False) -> _Any:
+        """
+        Return all remaining rows as a NumPy structured array or, if
+        columns, a dict of column name to 1-D array. Requires NumPy; see
+        numpy_columns for how dtype is taken and how nulls are handled.
+        """
+        # Check before consuming any results.
+        _require_numpy()
+        built = self.into_columns(typed=True)
+        return _numpy_columns(built, dtype) if columns else _numpy_records(built, dtype)
+
+    def _blocks(self, size: _Optional[int]) -> _Iterator[_Sequence[_Sequence[_Any]]]:
+        if size is not None and size < 1:
+            raise ValueError(f"invalid batch size {size}")
+        fetch = size or max(self.raw.arraysize, 1)
         while True:
-            value = self._into(target)
-            if value is None:
+            rows = self.raw.fetchmany(fetch)
+            if not rows:
                 break
-            yield value
+            yield rows
+            if size is None and len(rows) == fetch and fetch < _MAX_FETCH:
+                fetch = min(2 * fetch, _MAX_FETCH)
 
     def into1(self, target: _Target) -> _Any:
         ret = self._into(target)
@@ -151,19 +281,13 @@ class Cursor(_CursorBase):
 
     def _into(self, target: _Target) -> _Optional[_Any]:
         row = self.raw.fetchone()
-        # XXX - this test is ugly, but it is the easiest way to make something
-        # be concise on the user end.
-        if target == sequence:
-            return row
         if row is None:
             return None
-        kwargs = {}
-        col = 0
+        return self._row_factory(target)(row)
+
+    def _row_factory(self, target: _Target) -> _Callable[[_Sequence[_Any]], _Any]:
         assert self._colnames is not None
-        for colname in self._colnames:
-            kwargs[colname] = row[col]
-            col += 1
-        return target(**kwargs)
+        return _row_factory(tuple(self._colnames), target)
 
     def insert_into(self, table: str) -> InsertOperation:
         return InsertOperation(self, table)
@@ -171,30 +295,18 @@ class Cursor(_CursorBase):
     def update(self, table: str) -> UpdateOperation:
         return UpdateOperation(self, table)
 
+    def merge_into(self, table: str) -> MergeOperation:
+        return MergeOperation(self, table)
+
+    def bulk_load(self, table: str, rows: _Iterable[_Any], batch_size: _Optional[int] = None) -> list[int]:
+        return BulkLoadOperation(self, table).from_sources(rows, batch_size)
+
 # F u n c t i o n s
 
-def connect(mod: _ModuleType, *args, **kwargs) -> _ConnectionBase:
+def connect(mod: _ModuleType, *args, cache: _Optional[QueryCache] = None, rewrite_inserts: bool = False,
+        **kwargs) -> _ConnectionBase:
     """Given a PEP 249 compliant database module and connection parameters,
-       return am abnormal Connection object."""
-    return Connection(mod.connect(*args, **kwargs), mod.paramstyle, _driver_for(mod))
-
-def mapping(**kwargs) -> _Mapping[str, _Any]:
-    "For returning a mapping with .into()"
-    return kwargs
-
-def scalar(**kwargs) -> _Any:
-    "For returning a 1-column row as a scalar."
-    ncols = len(kwargs)
-    if ncols == 1:
-        return next(iter(kwargs.values()))
-    else:
-        raise UnexpectedResultError(f"unexpected column count of {ncols}")
-
-def sequence(**kwargs) -> _Sequence[_Any]:
-    "For returning a row as a sequence."
-    # This should never be called directly; it is merely detected.
-    raise NotImplementedError("sequence should never be called directly")
-
-def namespace(**kwargs) -> Namespace:
-    "For returning a namespace."
-    return Namespace(kwargs)
+       return am abnormal Connection object. The cache and rewrite_inserts
+       keyword arguments are as for Connection; all others go to the
+       module's connect."""
+    return Connection(mod.connect(*args, **kwargs), mod.paramstyle, _driver_for(mod), cache, rewrite_inserts)
@@ -0,0 +1,97 @@
+# Results as NumPy arrays, for those who have it. NumPy is an optional
+# dependency, only imported when asked for; everything else works without.
+# Columns are first gathered as by into_columns(typed=True), whose integer
+# and floating point arrays NumPy can take over without copying.
+
+# I m p o r t s
+
+from typing import Any
+
+from .columns import Columns
+from .exceptions import IncompleteDataError, NotSupportedError, UnexpectedResultError
+
+# V a r i a b l e s
+
+# Kinds of dtype NumPy may infer for a list column; anything else (bytes
+# truncated at nulls, say) is better kept as objects.
+_INFERRED_KINDS = frozenset("bU")
+
+# Kinds of dtype with no way to hold a null.
+_NOT_NULL_KINDS = frozenset("biu")
+
+# F u n c t i o n s
+
+def numpy_columns(columns: Columns, dtype: Any = None) -> dict[str, Any]:
+    """
+    Convert columns to a dict of 1-D NumPy arrays. Given a dtype with
+    fields, each column takes the type of the field with its name; given
+    any other dtype, all columns take it. Otherwise, integers become int64
+    (float64 if there are nulls), floating point numbers float64, strings
+    and booleans whatever NumPy makes of them, and everything else object.
+    Nulls become NaN in floating point columns and None in object ones;
+    in integer and boolean columns, they raise UnexpectedResultError.
+    """
+    np = require_numpy()
+    dt = None if dtype is None else np.dtype(dtype)
+    result = {}
+    for name, values in columns.items():
+        want = dt if dt is None or dt.fields is None else _field(dt, name)
+        if isinstance(values, list):
+            result[name] = _from_list(np, name, values, want)
+            continue
+        # Typed columns always have a mask of nulls.
+        array = np.frombuffer(values, dtype=values.typecode)
+        nulls = np.frombuffer(columns.nulls[name], dtype=np.bool_)
+        if want is None and nulls.any():
+            want = np.dtype(np.float64)
+        if want is not None and want.kind in _NOT_NULL_KINDS and nulls.any():
+            raise _null_error(name, want)
+        if want is not None:
+            array = array.astype(want)
+        if want is not None and want.kind == "f":
+            array[nulls] = np.nan
+        elif want is not None and want.kind == "O":
+            array[nulls] = None
+        result[name] = array
+    return result
+
+def numpy_records(columns: Columns, dtype: Any = None) -> Any:
+    "Like numpy_columns, but return a structured array, with a field per column."
+    np = require_numpy()
+    arrays = numpy_columns(columns, dtype)
+    nrows = len(next(iter(arrays.values()))) if arrays else 0
+    result = np.empty(nrows, dtype=[ (name, x.dtype) for name, x in arrays.items() ])
+    for name, array in arrays.items():
+        result[name] = array
+    return result
+
+def _field(dt: Any, name: str) -> Any:
+    field = dt.fields.get(name)
+    if field is None:
+        raise IncompleteDataError(f"Column {name!r} missing from dtype.")
+    return field[0]
+
+def _null_error(name: str, want: Any) -> UnexpectedResultError:
+    return UnexpectedResultError(f"Column {name!r} has nulls, which {want} cannot hold.")
+
+def _from_list(np: Any, name: str, values: list[Any], want: Any) -> Any:
+    if want is not None and want.kind in _NOT_NULL_KINDS and None in values:
+        raise _null_error(name, want)
+    if want is not None and want.kind != "O":
+        return np.array(values, dtype=want)
+    if want is None and None not in values:
+        array = np.array(values)
+        if array.ndim == 1 and array.dtype.kind in _INFERRED_KINDS:
+            return array
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+def require_numpy() -> Any:
+    "Import and return NumPy, raising NotSupportedError if it is absent."
+    # Deferred, as NumPy is costly to import and may not be installed.
+    try:
+        import numpy
+    except ImportError as e:
+        raise NotSupportedError(reason="NumPy is not installed") from e
+    return numpy
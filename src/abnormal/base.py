@@ -2,18 +2,22 @@
 # any other abnormal module, to avoid circular import problems.
 
 from abc import ABC, abstractmethod
-from collections.abc import Iterator, Sequence
+from collections.abc import Iterable, Iterator, Mapping, Sequence
 from dataclasses import dataclass
 from typing import Any, Callable, Optional, Unpack
 
 type Target = Callable[[Unpack[Any]], Any]
+type BulkLoader = Callable[[str, Sequence[str], Iterable[Sequence[Any]]], int]
 
 class ConnectionBase(ABC):
+    raw: Any
+    _converter: Any
     _driver: DriverBase
     _paramstyle: str
+    rewrite_inserts: bool
 
     @abstractmethod
-    def __init__(self, raw: Any, paramstyle: str, driver: DriverBase) -> None:
+    def __init__(self, raw: Any, paramstyle: str, driver: DriverBase, cache: Any = None, rewrite_inserts: bool = False) -> None:
         ...
 
     @abstractmethod
@@ -37,7 +41,11 @@ class ConnectionBase(ABC):
         ...
 
     @abstractmethod
-    def executemany(self, query: str, seq: Sequence) -> None:
+    def executemany(self, query: str, seq: Iterable, chunk_size: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def executemany_columns(self, query: str, columns: Mapping[str, Any], chunk_size: Optional[int] = None) -> None:
         ...
 
     @abstractmethod
@@ -48,7 +56,20 @@ class ConnectionBase(ABC):
     def update(self, table: str) -> PendingOperationBase:
         ...
 
+    @abstractmethod
+    def merge_into(self, table: str) -> PendingOperationBase:
+        ...
+
+    @abstractmethod
+    def bulk_load(self, table: str, rows: Iterable[Any], batch_size: Optional[int] = None) -> list[int]:
+        ...
+
+    @abstractmethod
+    def prepare(self, query: str) -> PreparedQueryBase:
+        ...
+
 class CursorBase(ABC):
+    raw: Any
     connection: ConnectionBase
 
     @abstractmethod
@@ -90,7 +111,11 @@ class CursorBase(ABC):
         ...
 
     @abstractmethod
-    def executemany(self, operation: str, seq: Sequence[Any]) -> None:
+    def executemany(self, operation: str, seq: Iterable[Any], chunk_size: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def executemany_columns(self, operation: str, columns: Mapping[str, Any], chunk_size: Optional[int] = None) -> None:
         ...
 
     @abstractmethod
@@ -121,6 +146,18 @@ class CursorBase(ABC):
     def into(self, target: Target) -> Iterator[Any]:
         ...
 
+    @abstractmethod
+    def into_batches(self, target: Target, size: Optional[int] = None) -> Iterator[list[Any]]:
+        ...
+
+    @abstractmethod
+    def into_columns(self, typed: bool = False) -> Mapping[str, Any]:
+        ...
+
+    @abstractmethod
+    def into_numpy(self, dtype: Any = None, columns: bool = False) -> Any:
+        ...
+
     @abstractmethod
     def into1(self, target: Target) -> Any:
         ...
@@ -133,11 +170,28 @@ class CursorBase(ABC):
     def update(self, table: str) -> PendingOperationBase:
         ...
 
+    @abstractmethod
+    def merge_into(self, table: str) -> PendingOperationBase:
+        ...
+
+    @abstractmethod
+    def bulk_load(self, table: str, rows: Iterable[Any], batch_size: Optional[int] = None) -> list[int]:
+        ...
+
 class DriverBase(ABC):
+    lazy_executemany: bool
+    max_parameters: Optional[int]
+    max_insert_rows: Optional[int]
+    max_insert_values: Optional[int]
+
     @abstractmethod
     def row_schema(self, connection: ConnectionBase, table_name: str) -> RowSchema:
         ...
 
+    @abstractmethod
+    def parameter_limit(self, connection: Any) -> Optional[int]:
+        ...
+
     @abstractmethod
     def split_table_name(self, unsplit: str) -> tuple[Optional[str], str]:
         ...
@@ -146,17 +200,66 @@ class DriverBase(ABC):
     def quote_identifier(self, unquoted: str) -> str:
         ...
 
+    @abstractmethod
+    def execute_prepared(self, cursor: Any, sql: str, params: Any) -> None:
+        ...
+
+    @abstractmethod
+    def multirow_insert(self, table: str, columns: Sequence[str], rows: Sequence[str]) -> str:
+        ...
+
+    @abstractmethod
+    def merge_into(self, table: str, keys: Sequence[str], columns: Sequence[str], params: Sequence[str]) -> str:
+        ...
+
+    @abstractmethod
+    def bulk_loader(self, cursor: Any) -> Optional[BulkLoader]:
+        ...
+
+    @abstractmethod
+    def insert_returning(self, table: str, columns: Sequence[str], params: Sequence[str], returning: Sequence[str]) -> str:
+        ...
+
+    @abstractmethod
+    def execute_returning(self, cursor: Any, sql: str, seq: Sequence[Any], returning: Sequence[str]) -> Iterator[Sequence[Any]]:
+        ...
+
 @dataclass
 class RowSchema:
     primary: tuple[str]
     others: tuple[str]
 
 
+class PreparedQueryBase(ABC):
+    @abstractmethod
+    def __call__(self, params: Any = {}, cursor: Optional[CursorBase] = None) -> CursorBase:
+        ...
+
+    @abstractmethod
+    def execute(self, params: Any = {}, cursor: Optional[CursorBase] = None) -> CursorBase:
+        ...
+
+    @abstractmethod
+    def executemany(self, seq: Iterable[Any], cursor: Optional[CursorBase] = None, chunk_size: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def into(self, target: Target, params: Any = {}, cursor: Optional[CursorBase] = None) -> Iterator[Any]:
+        ...
+
+    @abstractmethod
+    def into1(self, target: Target, params: Any = {}, cursor: Optional[CursorBase] = None) -> Any:
+        ...
+
 class PendingOperationBase(ABC):
     @abstractmethod
     def from_source(self, obj: Any) -> Optional[Any]:
         ...
 
+    @abstractmethod
+    def from_sources(self, objs: Iterable[Any], batch_size: Optional[int] = None) -> list[int]:
+        ...
+
     @abstractmethod
     def including(self, *args: str) -> PendingOperationBase:
         ...
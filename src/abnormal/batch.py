@@ -0,0 +1,174 @@
+# Multi-row inserts: many rows to a statement, for connectors whose
+# executemany costs a round trip per row anyway. Each statement is built
+# by repeating a one-row template, with every row's parameters renamed
+# (sno becomes r0_sno, r1_sno, ...) to keep them apart.
+
+# I m p o r t s
+
+from collections.abc import Callable, Iterable, Sequence
+from functools import lru_cache
+from itertools import batched
+from typing import Any, cast, NamedTuple, Optional
+
+from .base import CursorBase, DriverBase
+from .tlexer import tspans
+from .todb import CacheValue, compile_query
+
+# V a r i a b l e s
+
+# Used when the driver knows of no limit on rows per statement. Beyond a
+# few hundred rows, there is little more to be saved in round trips.
+DEFAULT_MAX_ROWS = 1000
+
+# C l a s s e s
+
+class SimpleInsert(NamedTuple):
+    "The parts of a single-row insert statement, as text."
+    table: str
+    columns: Sequence[str]
+    row: str
+
+class MultiRowInsert:
+    """
+    Inserts rows into a table, as many to a statement as the driver's
+    limits allow. Columns are quoted column names (if empty, none are
+    named); row is the parenthesized values of one row, with :name
+    parameters naming the data source attributes or keys to take their
+    values from. Given max_rows, statements insert no more rows than that.
+    """
+    def __init__(self, cursor: CursorBase, table: str, columns: Sequence[str], row: str, max_rows: Optional[int] = None) -> None:
+        self.cursor = cursor
+        self._table = table
+        self._columns = columns
+        self._row = row
+        self._params = [ (start, end) for start, end, kind in tspans(row, kinds={"param"}) ]
+        self.rows = rows_per_statement(cursor.connection._driver, len(self._params), _values(row), cursor.connection.raw)
+        if max_rows is not None:
+            self.rows = min(self.rows, max_rows)
+        names = list(dict.fromkeys([ row[start+1:end] for start, end in self._params ]))
+        # Only used to extract the values of each row.
+        self._source = CacheValue([], names, dict)
+        self._queries: dict[int, CacheValue] = {}
+
+    def __call__(self, rows: Iterable[Any]) -> int:
+        "Insert rows, returning the total row count (-1 if unknown)."
+        total = 0
+        for group in batched(rows, self.rows):
+            query = self._query(len(group))
+            self.cursor.raw.execute(query.sql, query.bind(self._bind(group)))
+            rowcount = self.cursor.raw.rowcount
+            total = -1 if total < 0 or rowcount < 0 else total + rowcount
+        return total
+
+    # Full statements are reused for as long as this lasts. They are large,
+    # and the last one of each load is of any size, so they are kept out of
+    # the connection's query cache, lest they crowd out the queries in it.
+    def _query(self, nrows: int) -> CacheValue:
+        query = self._queries.get(nrows)
+        if query is None:
+            groups = [ self._renamed(i) for i in range(nrows) ]
+            sql = self.cursor.connection._driver.multirow_insert(self._table, self._columns, groups)
+            query = self._queries[nrows] = compile_query(sql, self.cursor.connection._paramstyle)
+        return query
+
+    def _renamed(self, i: int) -> str:
+        parts = []
+        prev = 0
+        for start, end in self._params:
+            parts.append(self._row[prev:start])
+            parts.append(":" + renamed(self._row[start+1:end], i))
+            prev = end
+        parts.append(self._row[prev:])
+        return "".join(parts)
+
+    def _bind(self, group: Sequence[Any]) -> dict[str, Any]:
+        params = {}
+        # Bound into dicts, as the container says.
+        bind = cast(Callable[[Any], dict[str, Any]], self._source.bind)
+        for i, row in enumerate(group):
+            for name, value in bind(row).items():
+                params[renamed(name, i)] = value
+        return params
+
+# F u n c t i o n s
+
+# Statements are examined every time executemany is asked to rewrite them,
+# so remember what was found.
+@lru_cache(maxsize=256)
+def simple_insert(sql: str) -> Optional[SimpleInsert]:
+    """
+    If sql inserts a single row of values, some of them parameters, into
+    a table, and does nothing else (no select, no multiple rows, no
+    conflict handling or returning clause), return its parts, else None.
+    """
+    spans = [ (start, end) for start, end, kind in tspans(sql) if kind not in {"white", "comment"} ]
+    words = [ sql[start:end].lower() for start, end in spans ]
+    if words[:2] != [ "insert", "into" ]:
+        return None
+    # The table name (perhaps qualified) runs up to the column list or values.
+    i = 2
+    while i < len(words) and words[i] not in { "(", "values" }:
+        i += 1
+    if i == 2 or i == len(words):
+        return None
+    table = sql[spans[2][0]:spans[i-1][1]]
+    columns: list[str] = []
+    if words[i] == "(":
+        close = _closing(words, i)
+        if close is None or close == i + 1:
+            return None
+        columns = [ sql[spans[i+1][0]:spans[close-1][1]] ]
+        i = close + 1
+    if words[i:i+2] != [ "values", "(" ]:
+        return None
+    close = _closing(words, i + 1)
+    if close is None or words[close+1:] not in ([], [ ";" ]):
+        return None
+    row = sql[spans[i+1][0]:spans[close][1]]
+    if not any(kind == "param" for start, end, kind in tspans(row, kinds={"param"})):
+        return None
+    return SimpleInsert(table, columns, row)
+
+def _closing(words: Sequence[str], i: int) -> Optional[int]:
+    "Find the parenthesis closing the one at words[i]."
+    depth = 0
+    for j in range(i, len(words)):
+        if words[j] == "(":
+            depth += 1
+        elif words[j] == ")":
+            depth -= 1
+            if depth == 0:
+                return j
+    return None
+
+def renamed(name: str, row: int) -> str:
+    "The name a parameter goes by in the given row of a multi-row statement."
+    return f"r{row}_{name}"
+
+def rows_per_statement(driver: DriverBase, nparams: int, nvalues: Optional[int] = None, connection: Any = None) -> int:
+    """
+    How many rows of nparams parameters (and nvalues values, if not the
+    same) each fit in one statement, on the given raw connection if any.
+    """
+    rows = driver.max_insert_rows or DEFAULT_MAX_ROWS
+    max_parameters = driver.max_parameters if connection is None else driver.parameter_limit(connection)
+    if max_parameters is not None and nparams > 0:
+        rows = min(rows, max_parameters // nparams)
+    if nvalues is None:
+        nvalues = nparams
+    if driver.max_insert_values is not None and nvalues > 0:
+        rows = min(rows, driver.max_insert_values // nvalues)
+    return max(rows, 1)
+
+def _values(row: str) -> int:
+    "Count the values in a parenthesized row of them."
+    depth = 0
+    count = 1
+    for start, end, kind in tspans(row, kinds={"special"}):
+        if row[start] == "(":
+            depth += 1
+        elif row[start] == ")":
+            depth -= 1
+        elif row[start] == "," and depth == 1:
+            count += 1
+    return count
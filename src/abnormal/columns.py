@@ -0,0 +1,125 @@
+# Results by column rather than by row: each column's values collected
+# into one list or, for integer and floating point columns if so asked,
+# one array.array, which takes a fraction of the memory.
+
+# I m p o r t s
+
+from array import array
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+from .exceptions import InterfaceError
+
+# V a r i a b l e s
+
+# Array type codes for values of these (exact) types.
+_TYPECODES = { int: 'q', float: 'd' }
+
+# Integers beyond this in magnitude may not survive being made floats.
+_MAX_EXACT = 2 ** 53
+
+# C l a s s e s
+
+class Columns(dict[str, list[Any] | array]):
+    """
+    Maps column names to their values, in row order. Typed columns are
+    arrays, in which nulls are stored as zeros; nulls maps the name of
+    each to a bytearray, holding 1 for every row where it was null.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.nulls: dict[str, bytearray] = {}
+
+class ColumnBuilder:
+    """
+    Builds Columns from blocks of rows. Untyped, every column is a list.
+    Typed, a column becomes an array if its first non-null value is an int
+    or float, and goes back to being a list if a later value will not fit.
+    """
+    def __init__(self, colnames: Sequence[str], typed: bool = False) -> None:
+        # Columns are told apart by name alone.
+        duplicates = sorted(set([ x for x in colnames if colnames.count(x) > 1 ]))
+        if duplicates:
+            raise InterfaceError(reason=f"duplicate column names: {', '.join(duplicates)}")
+        self.colnames = colnames
+        self.typed = typed
+        self.columns = Columns()
+        self._length = 0
+        # Typed columns start out undecided, holding nothing until then.
+        self._undecided = set(colnames) if typed else set()
+        for name in colnames:
+            self.columns[name] = []
+
+    def add(self, rows: Sequence[Sequence[Any]]) -> None:
+        "Add a block of rows."
+        if not rows:
+            return
+        for name, values in zip(self.colnames, zip(*rows)):
+            column = self.columns[name]
+            if name in self._undecided:
+                self._decide(name, values)
+            elif isinstance(column, list):
+                column.extend(values)
+            elif not self._extend(name, column, values):
+                self._demote(name)
+                self.columns[name].extend(values)
+        self._length += len(rows)
+
+    def result(self) -> Columns:
+        "Return the columns built so far. Never-decided ones are all nulls."
+        for name in self._undecided:
+            self.columns[name] = [ None ] * self._length
+        self._undecided.clear()
+        return self.columns
+
+    def _decide(self, name: str, values: tuple[Any, ...]) -> None:
+        first = next((x for x in values if x is not None), None)
+        if first is None:
+            return
+        self._undecided.discard(name)
+        typecode = _TYPECODES.get(type(first))
+        if typecode is None:
+            self.columns[name] = [ None ] * self._length
+            self.columns[name].extend(values)
+            return
+        column = self.columns[name] = array(typecode, bytes(self._length * array(typecode).itemsize))
+        self.columns.nulls[name] = bytearray(b'\x01' * self._length)
+        if not self._extend(name, column, values):
+            self._demote(name)
+            self.columns[name].extend(values)
+
+    # Returns False (having changed nothing) if the values will not fit.
+    def _extend(self, name: str, column: array, values: tuple[Any, ...]) -> bool:
+        length = len(column)
+        mask = self.columns.nulls[name]
+        # Floating point arrays take integers too, rounding big ones.
+        if column.typecode == 'd' and not all([ _fits_float(x) for x in values ]):
+            return False
+        try:
+            if None in values:
+                column.extend([ 0 if x is None else x for x in values ])
+                mask.extend([ x is None for x in values ])
+            else:
+                column.extend(values)
+                mask.extend(bytes(len(values)))
+        except (TypeError, OverflowError):
+            del column[length:]
+            return False
+        return True
+
+    def _demote(self, name: str) -> None:
+        column = self.columns[name]
+        mask = self.columns.nulls.pop(name)
+        self.columns[name] = [ None if null else value for value, null in zip(column, mask) ]
+
+# F u n c t i o n s
+
+def _fits_float(value: Any) -> bool:
+    return type(value) is not int or -_MAX_EXACT <= value <= _MAX_EXACT
+
+def build_columns(colnames: Sequence[str], blocks: Iterable[Sequence[Sequence[Any]]], typed: bool = False) -> Columns:
+    "Build Columns from blocks of rows with the given column names."
+    builder = ColumnBuilder(colnames, typed)
+    for block in blocks:
+        builder.add(block)
+    return builder.result()
@@ -1,16 +1,33 @@
 from abc import ABC, abstractmethod
-from collections.abc import Callable
+from collections.abc import Callable, Iterable, Iterator, Sequence
 from dataclasses import dataclass
 from importlib import import_module
 from io import StringIO
+from itertools import batched
 from types import ModuleType
-from typing import Optional
+from typing import Any, Optional
 
-from .base import DriverBase, RowSchema
+from .base import BulkLoader, DriverBase, RowSchema
 from .dbtype import DbType, DBTYPES
-from .exceptions import InterfaceError
+from .exceptions import InterfaceError, NotSupportedError
 
 class Driver(DriverBase):
+    # Whether the connector's executemany accepts any iterable of
+    # parameter sets and consumes it lazily. Most want a sequence.
+    lazy_executemany = False
+
+    # Limits on the number of parameters in one statement, and the number
+    # of rows, and of values in all (rows times columns), in one multi-row
+    # insert, if any.
+    max_parameters: Optional[int] = None
+    max_insert_rows: Optional[int] = None
+    max_insert_values: Optional[int] = None
+
+    # The limit on parameters in one statement on the given raw connection,
+    # where that can vary with the server or library version.
+    def parameter_limit(self, connection) -> Optional[int]:
+        return self.max_parameters
+
     def split_table_name(self, unsplit: str) -> tuple[Optional[str], str]:
         n1, _, n2 = unsplit.partition(".")
         if n2:
@@ -32,12 +49,54 @@ class Driver(DriverBase):
             buf.write('"')
             return buf.getvalue()
 
+    # Used for prepared queries. Most connectors keep a statement cache of
+    # their own (sqlite3, oracledb) or offer no control over preparation,
+    # so by default this is just a plain execute.
+    def execute_prepared(self, cursor, sql: str, params) -> None:
+        cursor.execute(sql, params)
+
+    # Table and column names come already quoted, and each row as a
+    # parenthesized list of parameters. No columns means none are named.
+    def multirow_insert(self, table: str, columns: Sequence[str], rows: Sequence[str]) -> str:
+        return f"insert into {table}{_column_list(columns)} values {', '.join(rows)}"
+
+    # Insert a row or, if one with the same key exists, update it. Names
+    # come already quoted, and params (one per key, then one per other
+    # column) as :name parameters. Standard SQL does this with MERGE.
+    def merge_into(self, table: str, keys: Sequence[str], columns: Sequence[str], params: Sequence[str]) -> str:
+        return _merge(table, keys, columns, f"( values ( {', '.join(params)} ) ) as s ( {', '.join([ *keys, *columns ])} )")
+
+    # Given a raw cursor, return a function to load rows (sequences of
+    # values, in column order) into a table by whatever means is fastest,
+    # returning the row count. Names come already quoted. None means there
+    # is nothing better than executemany.
+    def bulk_loader(self, cursor) -> Optional[BulkLoader]:
+        return None
+
+    # Inserts that return generated keys (or other columns) of the new
+    # row. There is no standard way; each database has its own, if any.
+    def insert_returning(self, table: str, columns: Sequence[str], params: Sequence[str], returning: Sequence[str]) -> str:
+        raise NotSupportedError(reason=f"{self.__class__.__name__} cannot return generated keys")
+
+    # Given a raw cursor, run an insert from insert_returning (as
+    # converted) for each parameter set in seq, yielding the returned
+    # values for each. By default, a statement at a time.
+    def execute_returning(self, cursor, sql: str, seq: Sequence[Any], returning: Sequence[str]) -> Iterator[Sequence[Any]]:
+        for params in seq:
+            cursor.execute(sql, params)
+            yield cursor.fetchone()
+
 def driver_for(base_driver: ModuleType) -> Driver:
     return _DRIVERS[DBTYPES[base_driver.__name__]]
 
 # DB2
 
 class Db2Driver(Driver):
+    max_parameters = 32767
+
+    def insert_returning(self, table: str, columns: Sequence[str], params: Sequence[str], returning: Sequence[str]) -> str:
+        return f"select {', '.join(returning)} from final table ( {_insert(table, columns, params)} )"
+
     def row_schema(self, connection, table_name: str) -> RowSchema:
         dbname, tabname = self.split_table_name(table_name)
         primary = []
@@ -69,6 +128,44 @@ class Db2Driver(Driver):
 # C'est le mess.
 
 class OracleDriver(Driver):
+    max_parameters = 65535
+    # INSERT ALL counts every column of every row against the limit of
+    # 1000 columns (ORA-24335).
+    max_insert_values = 999
+
+    # Oracle has no VALUES table constructor, and no AS before aliases.
+    def merge_into(self, table: str, keys: Sequence[str], columns: Sequence[str], params: Sequence[str]) -> str:
+        source = ", ".join([ f"{param} {name}" for param, name in zip(params, [ *keys, *columns ]) ])
+        return _merge(table, keys, columns, f"( select {source} from dual ) s", alias="t")
+
+    # RETURNING INTO needs output variables, which cannot be added until
+    # after parameter conversion; see below.
+    def insert_returning(self, table: str, columns: Sequence[str], params: Sequence[str], returning: Sequence[str]) -> str:
+        return _insert(table, columns, params)
+
+    # Returned values go into arrays, one element per row; generated keys
+    # are taken to be numeric (identity columns or sequences).
+    def execute_returning(self, cursor, sql: str, seq: Sequence[Any], returning: Sequence[str]) -> Iterator[Sequence[Any]]:
+        seq = list(seq)
+        outputs = { f"abnormal_r{i}": cursor.var(int, arraysize=len(seq)) for i in range(len(returning)) }
+        cursor.setinputsizes(**outputs)
+        cursor.executemany(f"{sql} returning {', '.join(returning)} into {', '.join([ ':' + x for x in outputs ])}", seq)
+        for i in range(len(seq)):
+            yield tuple([ x.getvalue(i)[0] for x in outputs.values() ])
+
+    # executemany is array DML here; all that is saved is our own
+    # parameter conversion.
+    def bulk_loader(self, cursor) -> Optional[BulkLoader]:
+        def load(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+            params = ", ".join([ f":{i}" for i in range(1, len(columns) + 1) ])
+            return _array_load(cursor, f"insert into {table} ( {', '.join(columns)} ) values ( {params} )", rows)
+        return load
+
+    # No multi-row VALUES here; INSERT ALL does the same job.
+    def multirow_insert(self, table: str, columns: Sequence[str], rows: Sequence[str]) -> str:
+        into = f"into {table}{_column_list(columns)} values "
+        return "insert all " + " ".join([ into + row for row in rows ]) + " select 1 from dual"
+
     def row_schema(self, connection, table_name: str) -> RowSchema:
         dbname, tabname = self.split_table_name(table_name.upper())
 
@@ -113,11 +210,32 @@ class OracleDriver(Driver):
 # Sqlite3
 
 class Sqlite3Driver(Driver):
+    lazy_executemany = True
+    # As of SQLite 3.32; older versions allow only 999. Connections say
+    # what they allow.
+    max_parameters = 32766
+
+    def parameter_limit(self, connection) -> Optional[int]:
+        # Already imported, if connection is one of its.
+        import sqlite3
+        if hasattr(connection, "getlimit"):
+            return connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+        return self.max_parameters if sqlite3.sqlite_version_info >= (3, 32) else 999
+
+    def merge_into(self, table: str, keys: Sequence[str], columns: Sequence[str], params: Sequence[str]) -> str:
+        return _on_conflict(table, keys, columns, params)
+
+    # As of SQLite 3.35.
+    def insert_returning(self, table: str, columns: Sequence[str], params: Sequence[str], returning: Sequence[str]) -> str:
+        return f"{_insert(table, columns, params)} returning {', '.join(returning)}"
+
     def row_schema(self, connection, table_name: str) -> RowSchema:
         primary = []
         others = []
 
-        cursor = connection.execute("pragma table_info(:table_name)", locals())
+        # The pragma statement proper cannot take parameters; the
+        # equivalent table-valued function can.
+        cursor = connection.execute("select * from pragma_table_info(:table_name)", locals())
         namespace = import_module("abnormal").namespace
         try:
             for entry in cursor.into(namespace):
@@ -165,13 +283,191 @@ class StandardDriver(Driver):
         finally:
             cursor.close()
 
+# MySQL.
+
+class MysqlDriver(StandardDriver):
+    max_parameters = 65535
+
+    # LOAD DATA LOCAL INFILE must be enabled on both client and server,
+    # and lets the server read files from the client, so it is used only
+    # if asked for.
+    def __init__(self, local_infile: bool = False) -> None:
+        super().__init__("table_schema", "database()")
+        self.local_infile = local_infile
+
+    def bulk_loader(self, cursor) -> Optional[BulkLoader]:
+        if not self.local_infile:
+            return None
+        # Only LOAD DATA needs a file, and it is off by default.
+        import os
+        import tempfile
+        def load(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+            count = 0
+            # Binary values go in as hex, to be unhexed by the server; which
+            # columns hold them is only known once all rows are written.
+            binary = [ False ] * len(columns)
+            other = [ False ] * len(columns)
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="\n", suffix=".tsv", delete=False) as fp:
+                try:
+                    for row in rows:
+                        fields = []
+                        for i, value in enumerate(row):
+                            if isinstance(value, (bytes, bytearray, memoryview)):
+                                binary[i] = True
+                                fields.append(bytes(value).hex())
+                            else:
+                                other[i] = other[i] or value is not None
+                                fields.append(_infile_field(value))
+                        fp.write("\t".join(fields) + "\n")
+                        count += 1
+                    fp.close()
+                    mixed = [ x for x, b, o in zip(columns, binary, other) if b and o ]
+                    if mixed:
+                        raise InterfaceError(reason=f"binary and other values mixed in {', '.join(mixed)}")
+                    targets = [ f"@v{i}" if b else x for i, (x, b) in enumerate(zip(columns, binary)) ]
+                    sets = [ f"{x} = unhex(@v{i})" for i, (x, b) in enumerate(zip(columns, binary)) if b ]
+                    path = fp.name.replace("\\", "\\\\").replace("'", "\\'")
+                    sql = f"load data local infile '{path}' into table {table} character set utf8mb4 ( {', '.join(targets)} )"
+                    if sets:
+                        sql += f" set {', '.join(sets)}"
+                    cursor.execute(sql)
+                finally:
+                    os.remove(fp.name)
+            return count
+        return load
+
+    # VALUES() is deprecated in recent MySQL, but MariaDB has nothing else.
+    def merge_into(self, table: str, keys: Sequence[str], columns: Sequence[str], params: Sequence[str]) -> str:
+        updates = ", ".join([ f"{x} = values({x})" for x in columns or keys[:1] ])
+        return f"insert into {table} ( {', '.join([ *keys, *columns ])} ) values ( {', '.join(params)} ) on duplicate key update {updates}"
+
+# PostgreSQL. psycopg can be told to prepare statements server-side.
+
+class PostgresqlDriver(StandardDriver):
+    max_parameters = 65535
+
+    def __init__(self) -> None:
+        super().__init__("table_catalog", "current_catalog")
+
+    def execute_prepared(self, cursor, sql: str, params) -> None:
+        cursor.execute(sql, params, prepare=True)
+
+    def merge_into(self, table: str, keys: Sequence[str], columns: Sequence[str], params: Sequence[str]) -> str:
+        return _on_conflict(table, keys, columns, params)
+
+    def insert_returning(self, table: str, columns: Sequence[str], params: Sequence[str], returning: Sequence[str]) -> str:
+        return f"{_insert(table, columns, params)} returning {', '.join(returning)}"
+
+    # psycopg can pipeline the lot, keeping each statement's results.
+    def execute_returning(self, cursor, sql: str, seq: Sequence[Any], returning: Sequence[str]) -> Iterator[Sequence[Any]]:
+        cursor.executemany(sql, seq, returning=True)
+        while True:
+            yield cursor.fetchone()
+            if not cursor.nextset():
+                break
+
+    # psycopg cursors can COPY.
+    def bulk_loader(self, cursor) -> Optional[BulkLoader]:
+        if not callable(getattr(cursor, 'copy', None)):
+            return None
+        def load(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+            count = 0
+            with cursor.copy(f"copy {table} ( {', '.join(columns)} ) from stdin") as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+            return count
+        return load
+
+# Microsoft SQL Server.
+
+class SqlServerDriver(StandardDriver):
+    # 2100, less the two sp_executesql and sp_prepexec take for themselves.
+    max_parameters = 2098
+    max_insert_rows = 1000
+
+    def __init__(self) -> None:
+        super().__init__("table_catalog", "current_catalog")
+
+    # MERGE statements must be terminated here, and are only safe against
+    # concurrent inserts of the same key with HOLDLOCK.
+    def merge_into(self, table: str, keys: Sequence[str], columns: Sequence[str], params: Sequence[str]) -> str:
+        return super().merge_into(f"{table} with (holdlock)", keys, columns, params) + ";"
+
+    def insert_returning(self, table: str, columns: Sequence[str], params: Sequence[str], returning: Sequence[str]) -> str:
+        output = ", ".join([ "inserted." + x for x in returning ])
+        return f"insert into {table} ( {', '.join(columns)} ) output {output} values ( {', '.join(params)} )"
+
+    # pyodbc cursors can send parameters in arrays, if told to.
+    def bulk_loader(self, cursor) -> Optional[BulkLoader]:
+        if not hasattr(cursor, 'fast_executemany'):
+            return None
+        def load(table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+            params = ", ".join([ "?" ] * len(columns))
+            cursor.fast_executemany = True
+            try:
+                return _array_load(cursor, f"insert into {table} ( {', '.join(columns)} ) values ( {params} )", rows)
+            finally:
+                cursor.fast_executemany = False
+        return load
+
+# Helpers for generating inserts and upserts.
+
+def _insert(table: str, columns: Sequence[str], params: Sequence[str]) -> str:
+    return f"insert into {table} ( {', '.join(columns)} ) values ( {', '.join(params)} )"
+
+def _column_list(columns: Sequence[str]) -> str:
+    return f" ( {', '.join(columns)} )" if columns else ""
+
+def _merge(table: str, keys: Sequence[str], columns: Sequence[str], source: str, alias: str = "as t") -> str:
+    query = [ f"merge into {table} {alias} using {source} on (",
+        " and ".join([ f"t.{x} = s.{x}" for x in keys ]), ")" ]
+    if columns:
+        query += [ "when matched then update set", ", ".join([ f"{x} = s.{x}" for x in columns ]) ]
+    query += [ "when not matched then insert (", ", ".join([ *keys, *columns ]), ") values (",
+        ", ".join([ f"s.{x}" for x in [ *keys, *columns ] ]), ")" ]
+    return " ".join(query)
+
+def _on_conflict(table: str, keys: Sequence[str], columns: Sequence[str], params: Sequence[str]) -> str:
+    query = [ f"insert into {table} ( {', '.join([ *keys, *columns ])} ) values ( {', '.join(params)} )",
+        f"on conflict ( {', '.join(keys)} ) do" ]
+    if columns:
+        query += [ "update set", ", ".join([ f"{x} = excluded.{x}" for x in columns ]) ]
+    else:
+        query.append("nothing")
+    return " ".join(query)
+
+# Helpers for bulk loading.
+
+# Array DML sends whole arrays of rows at once, which must be held in
+# memory; this many rows at a time.
+_ARRAY_ROWS = 10000
+
+def _array_load(cursor, sql: str, rows: Iterable[Sequence[Any]]) -> int:
+    count = 0
+    for chunk in batched(rows, _ARRAY_ROWS):
+        cursor.executemany(sql, list(chunk))
+        count += len(chunk)
+    return count
+
+# LOAD DATA's default format: tab-separated, backslash escapes, \N for null.
+# Not for binary values, which are written as hex.
+_INFILE_ESCAPES = str.maketrans({ "\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0" })
+
+def _infile_field(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return str(int(value))
+    return str(value).translate(_INFILE_ESCAPES)
+
 # Has to be last, because driver classes have to be defined first.
 
 _DRIVERS: dict[DbType, Driver] = {
     DbType.DB2: Db2Driver(),
-    DbType.SQL_SERVER: StandardDriver("table_catalog", "current_catalog"),
-    DbType.MYSQL: StandardDriver("table_schema", "database()"),
+    DbType.SQL_SERVER: SqlServerDriver(),
+    DbType.MYSQL: MysqlDriver(),
     DbType.ORACLE: OracleDriver(),
-    DbType.POSTGRESQL: StandardDriver("table_catalog", "current_catalog"),
+    DbType.POSTGRESQL: PostgresqlDriver(),
     DbType.SQLITE3: Sqlite3Driver()
 }
@@ -37,14 +37,16 @@ class SqlError(Error):
 class IncompleteDataError(Error):
     """
     When an .insert_into or .update is fed inufficient data, i.e. data
-    with a missing or incomplete primary key.
+    with a missing or incomplete primary key. Also when a dtype given for
+    NumPy results has no field for one of the columns.
     """
 
 class InterfaceError(Error):
     """
     Something went wrong attempting to interface with the database.
     Currently used to report a failure to determine primary key columns
-    in a table.
+    in a table, and results with several columns of the same name where
+    names must be unique.
     """
 
 class InvalidStateError(Error):
@@ -54,3 +56,21 @@ class InvalidStateError(Error):
     mutually-exclusive .including and .excluding modifiers to a
     PendingOperation.
     """
+
+class NotSupportedError(Error):
+    """
+    When asked to do something the database (or our support for it)
+    cannot do. Currently used to report that generated keys cannot be
+    returned, and that NumPy results were asked for without NumPy
+    installed.
+    """
+
+class LoadError(Error):
+    """
+    When a parallel load fails part way. Has the statistics for each
+    worker (stats), and the exception that caused the failure as its
+    cause.
+    """
+    def __init__(self, reason: Optional[str] = None, stats: Optional[list] = None) -> None:
+        super().__init__(reason)
+        self.stats = stats or []
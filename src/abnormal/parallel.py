@@ -0,0 +1,187 @@
+# Loading rows in parallel, over several connections at once, each in a
+# worker thread or process of its own.
+
+# I m p o r t s
+
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from itertools import batched
+from time import perf_counter
+from typing import Any, Optional, Protocol
+import queue
+import threading
+
+from .base import ConnectionBase
+from .exceptions import LoadError
+
+# C l a s s e s
+
+# What workers and their queues and events have in common, whether for
+# threads or processes.
+
+class _Queue(Protocol):
+    def put(self, obj: Any) -> None: ...
+    def get(self) -> Any: ...
+
+class _Event(Protocol):
+    def set(self) -> None: ...
+    def is_set(self) -> bool: ...
+
+class _Worker(Protocol):
+    def start(self) -> None: ...
+    def join(self) -> None: ...
+
+@dataclass
+class WorkerStats:
+    worker: str
+    batches: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+# F u n c t i o n s
+
+def parallel_load(factory: Callable[[], ConnectionBase], table: str, rows: Iterable[Any],
+        workers: int = 4, batch_size: int = 1000, processes: bool = False) -> list[WorkerStats]:
+    """
+    Insert rows into table, batch_size at a time, using workers threads
+    (or processes), each with its own connection made by calling factory.
+    Each batch is inserted with insert_into(table).from_sources and
+    committed separately, so rows within a batch keep their order, but
+    batches may be committed in any order.
+
+    If a batch fails, it is rolled back, no further batches are started,
+    and once all workers have stopped, LoadError is raised, with the
+    failing batch's exception as its cause. Batches already committed stay
+    committed. Returns statistics for each worker.
+
+    With processes, factory and rows must be picklable, as workers may be
+    started afresh (the default on most platforms, Linux included from
+    Python 3.14) rather than forked: a top-level function will do for the
+    factory, but not a lambda or a partial holding a module.
+    """
+    if workers < 1:
+        raise ValueError(f"invalid worker count {workers}")
+    if batch_size < 1:
+        raise ValueError(f"invalid batch size {batch_size}")
+    batches: _Queue
+    results: _Queue
+    failed: _Event
+    pool: list[_Worker]
+    if processes:
+        # Only process pools need multiprocessing, which pulls in a good
+        # deal more on import than threading does.
+        import multiprocessing
+        import pickle
+        # Whatever the start method, find out now, not in every worker.
+        try:
+            pickle.dumps(factory)
+        except Exception as e:
+            raise TypeError(f"factory cannot be pickled for use in processes: {e}") from e
+        ctx = multiprocessing.get_context()
+        batches, results, failed = ctx.Queue(maxsize=2 * workers), ctx.Queue(), ctx.Event()
+        pool = [ ctx.Process(target=_worker, args=(f"process-{i}", factory, table, batches, results, failed, True))
+            for i in range(workers) ]
+    else:
+        batches, results, failed = queue.Queue(maxsize=2 * workers), queue.Queue(), threading.Event()
+        pool = [ threading.Thread(target=_worker, args=(f"thread-{i}", factory, table, batches, results, failed))
+            for i in range(workers) ]
+    # Only workers that did start need stopping, should starting one fail.
+    started: list[_Worker] = []
+    try:
+        for worker in pool:
+            worker.start()
+            started.append(worker)
+        for batch in batched(rows, batch_size):
+            if failed.is_set():
+                break
+            batches.put(list(batch))
+    finally:
+        for worker in started:
+            batches.put(None)
+        # Results must be collected before joining; a process cannot exit
+        # while the queue it has written to is still full.
+        outcomes = [ results.get() for worker in started ]
+        for worker in started:
+            worker.join()
+    stats = sorted([ x[0] for x in outcomes ], key=lambda x: x.worker)
+    errors = [ x[1] for x in outcomes if x[1] is not None ]
+    if errors:
+        raise LoadError(reason=f"parallel load into {table} failed: {errors[0]}", stats=stats) from errors[0]
+    return stats
+
+def _worker(name: str, factory: Callable[[], ConnectionBase], table: str, batches: _Queue, results: _Queue, failed: _Event,
+        in_process: bool = False) -> None:
+    stats = WorkerStats(name)
+    error: Optional[BaseException] = None
+    connection = None
+    # Whatever happens, post a result, lest parallel_load wait forever.
+    try:
+        try:
+            connection = factory()
+        except Exception as e:
+            error = e
+            failed.set()
+        # Keep taking batches until told to stop, even after a failure, so
+        # that whoever is supplying them is never left blocked.
+        while True:
+            try:
+                batch = batches.get()
+            except OSError:
+                raise
+            except Exception as e:
+                # A batch that could not be unpickled; the queue itself
+                # still works, and must be kept from filling up.
+                error = error or e
+                failed.set()
+                continue
+            if batch is None:
+                break
+            if failed.is_set():
+                continue
+            assert connection is not None
+            start = perf_counter()
+            try:
+                connection.insert_into(table).from_sources(batch)
+                connection.commit()
+            except Exception as e:
+                error = e
+                failed.set()
+                # The connection may well be lost; the original error is
+                # the one worth reporting.
+                _quietly(connection.rollback)
+                continue
+            stats.batches += 1
+            stats.rows += len(batch)
+            stats.seconds += perf_counter() - start
+        if connection is not None:
+            _quietly(connection.close)
+    except Exception as e:
+        error = error or e
+        failed.set()
+    finally:
+        if in_process:
+            error = _portable(error)
+        results.put((stats, error))
+
+# An error that cannot be pickled would be silently dropped by the queue,
+# and one that cannot be unpickled would turn into another error entirely,
+# so either is replaced by one that can be.
+def _portable(error: Optional[BaseException]) -> Optional[BaseException]:
+    if error is None:
+        return None
+    import pickle
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:
+        return RuntimeError(repr(error))
+    return error
+
+def _quietly(action: Callable[[], Any]) -> None:
+    try:
+        action()
+    except Exception:
+        pass
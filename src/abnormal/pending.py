@@ -1,13 +1,18 @@
 # Insert (insert_into) and update operations support.
 
 from abc import ABC, abstractmethod
-from collections.abc import Mapping, Sequence
-from typing import Any, Optional
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from itertools import batched, chain
+from typing import Any, cast, Literal, Optional
 
 from .base import CursorBase, PendingOperationBase
+from .batch import MultiRowInsert
+from .todb import CacheValue
 from .exceptions import IncompleteDataError, InvalidStateError
 from .driver import RowSchema
 
+type Returning = Literal[True] | str | Sequence[str]
+
 class _PendingOperation(PendingOperationBase):
     def __init__(self, cursor: CursorBase, table: str, mandatory_pk: bool) -> None:
         self.cursor = cursor
@@ -118,15 +123,119 @@ class _PendingOperation(PendingOperationBase):
         assert ret is not None
         return ret
 
+    # The column plan (and so the SQL) is worked out from the first source
+    # only; the rest must supply the same attributes or keys. Sources are
+    # sent batch_size at a time (all at once if None), each batch with one
+    # executemany.
+    def _from_sources(self, objs: Iterable[Any], batch_size: Optional[int]) -> list[int]:
+        if batch_size is not None and batch_size < 1:
+            raise ValueError(f"invalid batch size {batch_size}")
+        it = iter(objs)
+        for first in it:
+            break
+        else:
+            return []
+        self._from_source(first)
+        run = self._batch_runner()
+        it = chain([first], it)
+        return [ run(batch) for batch in ([ it ] if batch_size is None else batched(it, batch_size)) ]
+
+    # Returns a function that sends one batch of sources to the database
+    # and returns the row count.
+    def _batch_runner(self) -> Callable[[Iterable[Any]], int]:
+        query = self._sql()
+        def run(batch: Iterable[Any]) -> int:
+            self.cursor.executemany(query, batch)
+            return self.cursor.rowcount
+        return run
+
+    @abstractmethod
+    def _sql(self) -> str:
+        ...
+
 # It is not mandatory to fully specify (or even specify at all) the primary
 # key when inserting, because database tables commonly have rules for
 # defaulting it.
 class InsertOperation(_PendingOperation):
     def __init__(self, cursor: CursorBase, table: str) -> None:
         super().__init__(cursor, table, False)
+        self._multirow = False
 
-    def from_source(self, obj: Any) -> Optional[Any]:
+    # Returning may be True (for the primary key), a column name, or a
+    # sequence of column names. The former two return a single value if
+    # the key has only the one column, the last always returns a tuple.
+    def from_source(self, obj: Any, returning: Optional[Returning] = None) -> Optional[Any]:
         self._from_source(obj)
+        if not returning:
+            return self.cursor.execute(self._sql(), self._obj)
+        return next(self._returning_runner(returning)([ obj ]))[1]
+
+    def from_sources(self, objs: Iterable[Any], batch_size: Optional[int] = None, multirow: bool = False) -> list[int]:
+        """
+        Insert a row for each source, returning the row count reported for
+        each batch. If multirow, rows are inserted many to a statement
+        instead, as many as the driver allows.
+        """
+        self._multirow = multirow
+        return self._from_sources(objs, batch_size)
+
+    def from_sources_returning(self, objs: Iterable[Any], batch_size: Optional[int] = None,
+            returning: Returning = True) -> Iterator[tuple[Any, Any]]:
+        """
+        Insert a row for each source, yielding (source, key) pairs as each
+        batch is inserted.
+        """
+        if batch_size is not None and batch_size < 1:
+            raise ValueError(f"invalid batch size {batch_size}")
+        it = iter(objs)
+        for first in it:
+            break
+        else:
+            return
+        self._from_source(first)
+        run = self._returning_runner(returning)
+        it = chain([first], it)
+        for batch in [ it ] if batch_size is None else batched(it, batch_size):
+            yield from run(batch)
+
+    # Like _batch_runner, but the function returned yields (source, key)
+    # pairs. Keys come back with the inserts themselves, not afterwards.
+    def _returning_runner(self, returning: Returning) -> Callable[[Iterable[Any]], Iterator[tuple[Any, Any]]]:
+        assert self._row_schema is not None
+        driver = self.cursor.connection._driver
+        quote = driver.quote_identifier
+        if returning is True:
+            names = list(self._row_schema.primary)
+        elif isinstance(returning, str):
+            names = [ returning ]
+        else:
+            names = list(returning)
+        if not names:
+            raise ValueError(f"nothing to return from inserts into {self.table}: no primary key columns found"
+                if returning is True else f"no columns to return from inserts into {self.table}")
+        single = len(names) == 1 and (returning is True or isinstance(returning, str))
+        cols = self._filter(self._pk_columns + self._columns)
+        quoted = [ quote(x) for x in names ]
+        sql = driver.insert_returning(quote(self.table), [ quote(x) for x in cols ],
+            [ ':' + self._mustfind(x) for x in cols ], quoted)
+        cached = self.cursor.connection._converter.compile(sql, self.cursor.connection._paramstyle)
+        raw = self.cursor.raw
+        def run(batch: Iterable[Any]) -> Iterator[tuple[Any, Any]]:
+            batch = list(batch)
+            keys = driver.execute_returning(raw, cached.sql, [ cached.bind(x) for x in batch ], quoted)
+            for source, key in zip(batch, keys):
+                yield (source, key[0] if single else tuple(key))
+        return run
+
+    def _batch_runner(self) -> Callable[[Iterable[Any]], int]:
+        if not self._multirow:
+            return super()._batch_runner()
+        quote = self.cursor.connection._driver.quote_identifier
+        cols = self._filter(self._pk_columns + self._columns)
+        return MultiRowInsert(self.cursor, quote(self.table), [ quote(x) for x in cols ],
+            "( " + ", ".join([ ':' + self._mustfind(x) for x in cols ]) + " )")
+
+    def _sql(self) -> str:
         cols = self._filter(self._pk_columns + self._columns)
         query = [
             "insert into", self.cursor.connection._driver.quote_identifier(self.table),
@@ -134,8 +243,30 @@ class InsertOperation(_PendingOperation):
             "values",
             "(", ", ".join([ ':' + self._mustfind(x) for x in cols ]), ")"
         ]
+        return " ".join(query)
+
+# Loading rows in bulk, by the fastest means the connector offers (COPY,
+# LOAD DATA, array DML), else as a batched insert.
+class BulkLoadOperation(InsertOperation):
+    def from_sources(self, objs: Iterable[Any], batch_size: Optional[int] = None, multirow: bool = False) -> list[int]:
+        """
+        Load a row for each source, returning the row count for each
+        batch. Where the connector offers nothing faster, rows are
+        inserted as by InsertOperation, many to a statement if multirow.
+        """
+        return super().from_sources(objs, batch_size, multirow)
 
-        return self.cursor.execute(" ".join(query), self._obj)
+    def _batch_runner(self) -> Callable[[Iterable[Any]], int]:
+        loader = self.cursor.connection._driver.bulk_loader(self.cursor.raw)
+        if loader is None:
+            return super()._batch_runner()
+        quote = self.cursor.connection._driver.quote_identifier
+        cols = self._filter(self._pk_columns + self._columns)
+        table = quote(self.table)
+        columns = [ quote(x) for x in cols ]
+        # Bound into lists, as the container says.
+        bind = cast(Callable[[Any], Sequence[Any]], CacheValue([], [ self._mustfind(x) for x in cols ], list).bind)
+        return lambda batch: loader(table, columns, map(bind, batch))
 
 # It is mandatory to fully specify the primary key when updating, to avoid
 # accidentally overwriting a lot of data. (Those who really do want to
@@ -146,6 +277,17 @@ class UpdateOperation(_PendingOperation):
 
     def from_source(self, obj: Any) -> Optional[Any]:
         self._from_source(obj)
+        return self.cursor.execute(self._sql(), self._obj)
+
+    def from_sources(self, objs: Iterable[Any], batch_size: Optional[int] = None) -> list[int]:
+        """
+        Update the row for each source, returning the row count reported
+        for each batch. A count short of the batch size means some keys
+        matched no row.
+        """
+        return self._from_sources(objs, batch_size)
+
+    def _sql(self) -> str:
         query = [ "update ", self.cursor.connection._driver.quote_identifier(self.table), " set" ]
 
         needs_comma = False
@@ -166,9 +308,34 @@ class UpdateOperation(_PendingOperation):
                 query.append(" and ")
             else:
                 query.append(" ")
-                needs_comma = True
+                needs_and = True
             query.append(self.cursor.connection._driver.quote_identifier(col))
             query.append(" = :")
             query.append(self._mustfind(col))
 
-        return self.cursor.execute("".join(query), self._obj)
+        return "".join(query)
+
+# Insert a row, or update it if one with the same primary key exists, in
+# one statement. As with updates, the primary key must be fully specified.
+class MergeOperation(_PendingOperation):
+    def __init__(self, cursor: CursorBase, table: str) -> None:
+        super().__init__(cursor, table, True)
+
+    def from_source(self, obj: Any) -> Optional[Any]:
+        self._from_source(obj)
+        return self.cursor.execute(self._sql(), self._obj)
+
+    def from_sources(self, objs: Iterable[Any], batch_size: Optional[int] = None) -> list[int]:
+        """
+        Insert or update a row for each source, returning the row count
+        reported for each batch (which some databases count differently
+        for inserts and updates).
+        """
+        return self._from_sources(objs, batch_size)
+
+    def _sql(self) -> str:
+        quote = self.cursor.connection._driver.quote_identifier
+        keys = self._filter(self._pk_columns)
+        columns = self._filter(self._columns)
+        return self.cursor.connection._driver.merge_into(quote(self.table), [ quote(x) for x in keys ],
+            [ quote(x) for x in columns ], [ ':' + self._mustfind(x) for x in keys + columns ])
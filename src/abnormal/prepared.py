@@ -0,0 +1,52 @@
+# Prepared queries: converted once, then executed any number of times, on
+# any cursor of the connection they were prepared for, from any thread.
+
+from collections.abc import Iterable, Iterator
+from typing import Any, Optional
+
+from .base import ConnectionBase, CursorBase, PreparedQueryBase, Target
+from .todb import CacheValue
+
+class PreparedQuery(PreparedQueryBase):
+    connection: ConnectionBase
+    query: str
+    _cached: CacheValue
+
+    def __init__(self, connection: ConnectionBase, query: str, cached: CacheValue) -> None:
+        object.__setattr__(self, 'connection', connection)
+        object.__setattr__(self, 'query', query)
+        object.__setattr__(self, '_cached', cached)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{self.__class__.__name__} objects are immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{self.__class__.__name__} objects are immutable")
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.query!r})"
+
+    @property
+    def sql(self) -> str:
+        "The query, as actually sent to the database."
+        return self._cached.sql
+
+    def __call__(self, params: Any = {}, cursor: Optional[CursorBase] = None) -> CursorBase:
+        return self.execute(params, cursor)
+
+    def execute(self, params: Any = {}, cursor: Optional[CursorBase] = None) -> CursorBase:
+        if cursor is None:
+            cursor = self.connection.cursor()
+        # Only our own Cursor class can be handed already-converted SQL.
+        return cursor._execute(self._cached.sql, self._cached.bind(params), True)  # type: ignore
+
+    def executemany(self, seq: Iterable[Any], cursor: Optional[CursorBase] = None, chunk_size: Optional[int] = None) -> None:
+        if cursor is None:
+            cursor = self.connection.cursor()
+        cursor._executemany(self._cached.sql, map(self._cached.bind, seq), chunk_size)  # type: ignore
+
+    def into(self, target: Target, params: Any = {}, cursor: Optional[CursorBase] = None) -> Iterator[Any]:
+        return self.execute(params, cursor).into(target)
+
+    def into1(self, target: Target, params: Any = {}, cursor: Optional[CursorBase] = None) -> Any:
+        return self.execute(params, cursor).into1(target)
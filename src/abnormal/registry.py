@@ -0,0 +1,77 @@
+# Named queries, kept in a directory of .sql files (one query per file, named
+# after the file), all prepared up front when a service starts.
+
+from collections.abc import Iterator, Mapping
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+from .base import ConnectionBase, PreparedQueryBase
+from .exceptions import SqlError
+from .tlexer import tspans
+from .todb import _param_free
+
+class QueryRegistry(Mapping[str, PreparedQueryBase]):
+    """
+    Prepared queries by name. Available as items and also, where the name is
+    a valid identifier that does not clash with a method, as attributes.
+    """
+    def __init__(self, queries: Mapping[str, PreparedQueryBase], compile_times: Mapping[str, float]) -> None:
+        self._queries = dict(queries)
+        self.compile_times = dict(compile_times)
+
+    def __getitem__(self, name: str) -> PreparedQueryBase:
+        return self._queries[name]
+
+    def __getattr__(self, name: str) -> PreparedQueryBase:
+        try:
+            return self.__dict__['_queries'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._queries)
+
+    def __len__(self) -> int:
+        return len(self._queries)
+
+    def slow(self, threshold: float = 0.0) -> list[tuple[str, float]]:
+        """
+        Return (name, seconds) for each query that took longer than threshold
+        seconds to compile, slowest first.
+        """
+        return sorted([ x for x in self.compile_times.items() if x[1] > threshold ],
+            key=lambda x: x[1], reverse=True)
+
+def load_queries(connection: ConnectionBase, directory: str | Path, workers: Optional[int] = None) -> QueryRegistry:
+    """
+    Read every .sql file in directory and prepare it for connection. The
+    SQL is lexed (and therefore checked) now, rather than on first use;
+    SqlError is raised, naming the file, if a query cannot be made sense of.
+    If workers is given, that many threads share the work (which helps
+    only on free-threaded Python builds).
+    """
+    paths = sorted(Path(directory).glob("*.sql"))
+    if workers is None or workers < 2:
+        results = [ _load(connection, path) for path in paths ]
+    else:
+        # Only wanted with worker threads, which few callers ask for;
+        # concurrent.futures is slow to import for a single-threaded load.
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda path: _load(connection, path), paths))
+    return QueryRegistry({ x[0]: x[1] for x in results }, { x[0]: x[2] for x in results })
+
+def _load(connection: ConnectionBase, path: Path) -> tuple[str, PreparedQueryBase, float]:
+    query = path.read_text(encoding="utf-8")
+    start = perf_counter()
+    try:
+        # Queries without parameters are not lexed when prepared, so check
+        # them explicitly.
+        if _param_free(query):
+            for span in tspans(query, kinds=()):
+                pass
+        prepared = connection.prepare(query)
+    except SqlError as e:
+        raise SqlError(reason=f"{path}: {e}") from e
+    return (path.stem, prepared, perf_counter() - start)
@@ -0,0 +1,111 @@
+# Turning result rows into whatever into was asked for. Rather than build
+# keyword arguments for every row, a function is compiled for each set of
+# column names and target, doing as little per row as that target needs.
+
+# I m p o r t s
+
+from collections import namedtuple
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import is_dataclass
+from functools import lru_cache, partial
+from inspect import Parameter, signature
+from operator import itemgetter
+from typing import Any
+
+from .base import Target
+from .exceptions import UnexpectedResultError
+from .misc import Namespace
+
+# V a r i a b l e s
+
+type RowFactory = Callable[[Sequence[Any]], Any]
+
+# F u n c t i o n s
+
+def mapping(**kwargs) -> Mapping[str, Any]:
+    "For returning a mapping with .into()"
+    return kwargs
+
+def scalar(**kwargs) -> Any:
+    "For returning a 1-column row as a scalar."
+    ncols = len(kwargs)
+    if ncols == 1:
+        return next(iter(kwargs.values()))
+    else:
+        raise UnexpectedResultError(f"unexpected column count of {ncols}")
+
+def sequence(**kwargs) -> Sequence[Any]:
+    "For returning a row as a sequence."
+    # This should never be called directly; it is merely detected.
+    raise NotImplementedError("sequence should never be called directly")
+
+def namespace(**kwargs) -> Namespace:
+    "For returning a namespace."
+    return Namespace(kwargs)
+
+def record(**kwargs) -> tuple[Any, ...]:
+    "For returning a row as a record: a tuple with a named field per column."
+    return record_maker(tuple(kwargs))(kwargs.values())
+
+# One class per distinct set of column names, so each record costs no more
+# than a tuple. Names that cannot be fields (duplicates, keywords, "count(*)")
+# are renamed positionally, to _0, _1 and so on.
+@lru_cache(maxsize=256)
+def record_maker(colnames: tuple[str, ...]) -> Callable[[Iterable[Any]], tuple[Any, ...]]:
+    "Return a function making records of the values for the given column names."
+    # What _make does, less checking the length, which is that of colnames.
+    return partial(tuple.__new__, namedtuple("Record", colnames, rename=True))
+
+def identity(row: Sequence[Any]) -> Sequence[Any]:
+    return row
+
+def row_factory(colnames: tuple[str, ...], target: Target) -> RowFactory:
+    "Return a function turning a row with the given column names into target."
+    try:
+        hash(target)
+    except TypeError:
+        return _row_factory(colnames, target)
+    return _cached_row_factory(colnames, target)
+
+# Targets are usually functions and classes, which are hashable, and a
+# program only uses so many of them.
+@lru_cache(maxsize=256)
+def _cached_row_factory(colnames: tuple[str, ...], target: Target) -> RowFactory:
+    return _row_factory(colnames, target)
+
+def _row_factory(colnames: tuple[str, ...], target: Target) -> RowFactory:
+    if target is sequence:
+        return identity
+    if target is mapping:
+        return lambda row: dict(zip(colnames, row))
+    if target is namespace:
+        return lambda row: Namespace(dict(zip(colnames, row)))
+    if target is record:
+        return record_maker(colnames)
+    if target is scalar:
+        if len(colnames) == 1:
+            return itemgetter(0)
+        # Only an error if there turn out to be rows.
+        return lambda row: scalar(**dict(zip(colnames, row)))
+    if _positional(colnames, target):
+        # Only a NamedTuple's own class is sure to be made just as _make
+        # does it; a subclass may have its own __new__.
+        if "_field_defaults" in vars(target):
+            return target._make  # type: ignore
+        return lambda row: target(*row)
+    return lambda row: target(**dict(zip(colnames, row)))
+
+# Whether target is a dataclass or NamedTuple that takes exactly the
+# columns, in order, as positional arguments. What counts is how it is
+# actually constructed; a subclass may take its fields in another order.
+def _positional(colnames: tuple[str, ...], target: Target) -> bool:
+    if not isinstance(target, type):
+        return False
+    if not is_dataclass(target) and not (issubclass(target, tuple) and hasattr(target, "_fields")):
+        return False
+    try:
+        params = signature(target).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    return all([ x.kind == Parameter.POSITIONAL_OR_KEYWORD for x in params ]) and \
+        tuple([ x.name for x in params ]) == colnames
@@ -7,9 +7,9 @@
 
 # I m p o r t s
 
-from .ply import lex
 from dataclasses import dataclass
 import re
+import threading
 
 from .exceptions import SqlError
 
@@ -34,6 +34,14 @@ t_ident = r'\w+|"(\\.|""|[^"])*"|`(\\.|``|[^`])*`'
 t_param = r':\w+'
 t_special = r'["%\&\'\(\)\*\+,-\.\/;<=>\?_\|\[\]]'
 
+# Building a PLY lexer means reflecting over this module, validating every
+# rule (which involves reading our own source) and compiling the master
+# regular expression. That is far too much work to do per query, so we do
+# it once and hand out clones of this prototype instead. PLY itself is not
+# even imported until then; most programs never need it.
+_prototype = None
+_prototype_lock = threading.Lock()
+
 # C l a s s e s
 
 @dataclass
@@ -74,30 +82,226 @@ def t_multiop(t):
 # PLY requires we define this one.
 
 def t_error(t):
-    offset = t.lexer.lexpos - len(t.value)
-    raise SqlError(reason=f"bad SQL at offset {offset}")
+    raise SqlError(reason=f"bad SQL at offset {t.lexpos}")
 
-# This is the sole function that is intended to be called from other
-# modules.
-# TODO: this may need to wrap exceptions
-def tlexer(sql):
+# Regex engine. Recognizes exactly what the rules above do, in the same
+# order of priority, but in time linear in the length of its input, which
+# PLY cannot promise: on an unterminated quote, the overlapping
+# alternatives in t_pstring and friends backtrack exponentially, and each
+# unterminated /* costs a scan to the end of the line.
+#
+# The master regular expression therefore only ever matches in a single
+# forward pass. Quoted tokens are tried with possessive versions of the
+# rules first; PLY's backslash escapes can also be plain characters, but
+# only need to be when a quote would otherwise go unterminated, and those
+# (rare) cases, along with C comments, are finished off by hand.
+
+def _body(q):
+    return rf"(?:[^{q}\\]++|\\[^\n]|\\(?=\n|$)|{q}{q})*+"
+
+def _quoted(q):
+    return q + _body(q) + q
+
+_MASTER = re.compile(r"""
+    (?P<white>\s++)
+  | (?P<comment>--[^\n]*+\n?)
+  | (?P<copen>/\*)
+  | (?P<pstring>""" + _quoted("'") + r""")
+  | (?P<squote>')
+  | (?P<astring>\w++""" + _quoted("'") + r""")
+  | (?P<aword>\w++(?='))
+  | (?P<multiop><>|<=|>=|\|\||\.\.|!=)
+  | (?P<ident>\w++|""" + _quoted('"') + "|" + _quoted('`') + r""")
+  | (?P<dquote>")
+  | (?P<bquote>`)
+  | (?P<special>["%&'()*+,\-./;<=>?_|\[\]])
+  | (?P<param>:\w++)
+  | (?P<error>(?s:.))
+""", re.UNICODE | re.VERBOSE)
+
+_BODIES = { q: re.compile(_body(q), re.UNICODE) for q in "'\"`" }
+
+class _Scanner:
+    """
+    The hard cases of the regex engine. Lookups only ever move forwards
+    through the input, and their results are remembered, which is what
+    keeps things linear.
     """
-    Tokenize input. Uses a fresh lexer each time so as to be thread safe.
+    def __init__(self, sql):
+        self.sql = sql
+        self._last = {}
+        self._next = {}
+
+    def quoted(self, q, start):
+        """
+        Return the end of the quoted token opening at start, or None if
+        there is none. PLY would take escapes and doubled quotes greedily,
+        except where that would leave no closing quote, so do the same,
+        but never go beyond the last quote character of the input.
+        """
+        last = self._last.get(q)
+        if last is None:
+            last = self._last[q] = self.sql.rfind(q)
+        if last <= start:
+            return None
+        end = _BODIES[q].match(self.sql, start + 1, last).end()
+        if end < last and self.sql[end] == q:
+            return end + 1
+        return last + 1
+
+    def comment(self, start):
+        "Return the end of the C comment opening at start, or None."
+        close = self._find("*/", start + 2)
+        if close < 0:
+            return None
+        newline = self._find("\n", start + 2)
+        if newline >= 0 and newline < close:
+            return None
+        return close + 2
+
+    def _find(self, needle, start):
+        found, since = self._next.get(needle, (None, -1))
+        if found is None or since > start or 0 <= found < start:
+            found = self.sql.find(needle, start)
+            self._next[needle] = (found, start)
+        return found
+
+_WHITE = frozenset(['comment', 'white'])
+
+# Which engine tlexer uses when not told otherwise. Both produce identical
+# output; ply is retained as the reference implementation, but is not safe
+# to use on untrusted input.
+DEFAULT_ENGINE = "regex"
+
+def _new_lexer():
+    """
+    Return a lexer ready for input. Clones are cheap shallow copies that
+    share the prototype's compiled tables, but keep their own input state,
+    so each caller gets a private one and thread safety is preserved.
     """
-    lexer = lex.lex(reflags=re.UNICODE | re.VERBOSE)
+    global _prototype
+    if _prototype is None:
+        with _prototype_lock:
+            if _prototype is None:
+                from .ply import lex
+                _prototype = lex.lex(reflags=re.UNICODE | re.VERBOSE)
+    return _prototype.clone()
+
+# Both engines produce spans: (start, end, kind) offsets into the query,
+# with each run of comments and whitespace reported as one "white" span.
+# Only spans of the requested kinds are yielded, but all input is lexed
+# (and therefore checked) regardless.
+
+def _ply_spans(sql, kinds):
+    lexer = _new_lexer()
     lexer.input(sql)
-    was_white = False
+    white_start = None
     while True:
         tok = lexer.token()
         if not tok:
             break
-        # Compress comments and whitespace runs, if needed
-        if tok.type in set(['comment', 'white']):
-            if was_white:
-                continue
-            else:
-                was_white = True
-                yield SqlToken(" ", False)
+        if tok.type in _WHITE:
+            if white_start is None:
+                white_start = tok.lexpos
+            white_end = lexer.lexpos
+            continue
+        if white_start is not None:
+            if "white" in kinds:
+                yield (white_start, white_end, "white")
+            white_start = None
+        if tok.type in kinds:
+            yield (tok.lexpos, lexer.lexpos, tok.type)
+    if white_start is not None and "white" in kinds:
+        yield (white_start, white_end, "white")
+
+def _regex_spans(sql, kinds):
+    white_start = None
+    scanner = None
+    pos = 0
+    length = len(sql)
+    while pos < length:
+        m = _MASTER.match(sql, pos)
+        kind = m.lastgroup
+        end = m.end()
+        if kind in _HARD:
+            if scanner is None:
+                scanner = _Scanner(sql)
+            kind, end = _HARD[kind](scanner, pos, end)
+        if kind in _WHITE:
+            if white_start is None:
+                white_start = pos
+            white_end = end
+            pos = end
+            continue
+        if white_start is not None:
+            if "white" in kinds:
+                yield (white_start, white_end, "white")
+            white_start = None
+        if kind == "error":
+            raise SqlError(reason=f"bad SQL at offset {pos}")
+        if kind in kinds:
+            yield (pos, end, kind)
+        pos = end
+    if white_start is not None and "white" in kinds:
+        yield (white_start, white_end, "white")
+
+# How to finish off each hard case, and what to fall back on if it turns
+# out not to be a comment or quoted token after all. Each returns the
+# token's kind and end.
+
+def _hard(kind, finish, fallback):
+    def handle(scanner, start, end):
+        result = finish(scanner, start, end)
+        if result is None:
+            return (fallback, end if fallback == "ident" else start + 1)
+        return (kind, result)
+    return handle
+
+_HARD = {
+    'copen': _hard("comment", lambda sc, start, end: sc.comment(start), "special"),
+    'squote': _hard("pstring", lambda sc, start, end: sc.quoted("'", start), "special"),
+    'aword': _hard("astring", lambda sc, start, end: sc.quoted("'", end), "ident"),
+    'dquote': _hard("ident", lambda sc, start, end: sc.quoted('"', start), "special"),
+    'bquote': _hard("ident", lambda sc, start, end: sc.quoted('`', start), "error")
+}
+
+_ENGINES = {
+    'ply': _ply_spans,
+    'regex': _regex_spans
+}
+
+# Span kinds: every token type, less comments (which are folded into
+# "white").
+KINDS = frozenset(tokens) - frozenset(["comment"])
+
+def _engine(engine):
+    try:
+        return _ENGINES[DEFAULT_ENGINE if engine is None else engine]
+    except KeyError:
+        raise ValueError(f"unknown tlexer engine {engine!r}") from None
+
+def _tokens(sql, spans):
+    for start, end, kind in spans:
+        if kind == "white":
+            yield SqlToken(" ", False)
         else:
-            was_white = False
-            yield SqlToken(tok.value, tok.type == "param")
+            yield SqlToken(sql[start:end], kind == "param")
+
+# These are the sole functions that are intended to be called from other
+# modules.
+# TODO: this may need to wrap exceptions
+
+def tlexer(sql, engine=None):
+    """
+    Tokenize input. Thread safe. The engine may be "regex" or "ply"; if
+    not specified, DEFAULT_ENGINE is used.
+    """
+    return _tokens(sql, _engine(engine)(sql, KINDS))
+
+def tspans(sql, engine=None, kinds=KINDS):
+    """
+    Tokenize input without copying it, yielding (start, end, kind) tuples
+    for each token whose kind is in kinds. A "white" span should be read
+    as a single space, exactly as tlexer does.
+    """
+    return _engine(engine)(sql, kinds)
@@ -1,14 +1,21 @@
-# Helpers for sending data to the database.
-# TODO: needs to be class-based, so can have one instance per connection,
-# so each connection gets its own private query cache. Or kill the cache.
+# Helpers for sending data to the database. Converted queries are cached
+# in a QueryCache, of which each connection normally has its own; one may
+# also be shared between connections, as entries are keyed by paramstyle.
 
 # I m p o r t s
 
-from collections.abc import Callable, Mapping, MutableMapping, MutableSequence, Sequence
+from collections import OrderedDict
+from collections.abc import Callable, Iterator, Mapping, MutableMapping, MutableSequence, Sequence
 from dataclasses import dataclass
-from typing import Any
+from functools import lru_cache
+from itertools import repeat
+from operator import attrgetter, itemgetter
+from typing import Any, Optional
+import re
+import threading
 
-from .tlexer import SqlToken, tlexer
+from .exceptions import IncompleteDataError
+from .tlexer import tspans
 
 # V a r i a b l e s
 
@@ -20,9 +27,12 @@ _INITIALS = {
     'pyformat': dict
 }
 
+DEFAULT_CACHE_SIZE = 1024
+
 # Also see below at end of file.
 
 type Params = MutableSequence[Any] | MutableMapping[str, Any]
+type Binder = Callable[[Any], Params]
 
 # C l a s s e s
 
@@ -32,109 +42,239 @@ class CacheKey:
     paramstyle: str
 
 class CacheValue:
-    def __init__(self, rawsql: Sequence[str], names: Sequence[str]):
+    """
+    A converted query. Knows the names of the parameters it needs, and how
+    to extract them from a data source into a container of the given type
+    (list for the positional paramstyles, dict for the others).
+    """
+    def __init__(self, rawsql: Sequence[str], names: Sequence[str], container: type = list):
         self.sql = ''.join(rawsql)
         self.names = names
+        self._container = container
+        self._binders: dict[type, Binder] = {}
+
+    def bind(self, params: Any) -> Params:
+        "Extract the parameters needed by this query from params."
+        # Binders are compiled once per class of data source and reused.
+        # Mostly there is only the one class.
+        try:
+            binder = self._binders[type(params)]
+        except KeyError:
+            binder = self._binders[type(params)] = self._compile(type(params))
+        return binder(params)
+
+    def bind_columns(self, columns: Mapping[str, Any]) -> Iterator[Sequence[Any] | Mapping[str, Any]]:
+        """
+        Extract the parameters needed by this query, row by row, from a
+        mapping of names to equally long columns (sequences, or objects
+        exposing the buffer protocol). Positional parameters come out as
+        tuples.
+        """
+        columns = { name: _column(name, column) for name, column in columns.items() }
+        if len(set(map(len, columns.values()))) > 1:
+            raise IncompleteDataError("Columns must all be of the same length.")
+        names = self._names()
+        try:
+            needed = [ columns[name] for name in names ]
+        except KeyError as e:
+            raise IncompleteDataError(f"Column {e.args[0]!r} missing from data source.") from None
+        if not names:
+            nrows = len(next(iter(columns.values()), ()))
+            return ( self._container() for i in range(nrows) )
+        if self._container is list:
+            return zip(*needed)
+        return map(dict, map(zip, repeat(names), zip(*needed)))
+
+    def _names(self) -> list[str]:
+        return list(self.names) if self._container is list else list(dict.fromkeys(self.names))
+
+    def _compile(self, source: type) -> Binder:
+        names = self._names()
+        if not names:
+            container = self._container
+            return lambda params: container()
+        getter = itemgetter(*names) if issubclass(source, Mapping) else attrgetter(*names)
+        if self._container is list:
+            if len(names) == 1:
+                return lambda params: [getter(params)]
+            return lambda params: list(getter(params))
+        if len(names) == 1:
+            name = names[0]
+            return lambda params: {name: getter(params)}
+        return lambda params: dict(zip(names, getter(params)))
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+class QueryCache:
+    """
+    A thread-safe cache of converted queries, holding at most maxsize
+    entries and discarding the least recently used ones to make room.
+    """
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        self._maxsize = maxsize
+        self._entries: OrderedDict[CacheKey, CacheValue] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value: int) -> None:
+        if value < 1:
+            raise ValueError("maxsize must be positive")
+        with self._lock:
+            self._maxsize = value
+            self._evict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: CacheKey) -> Optional[CacheValue]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: CacheKey, value: CacheValue) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(hits=self.hits, misses=self.misses,
+                evictions=self.evictions, size=len(self._entries),
+                maxsize=self._maxsize)
+
+    def _evict(self) -> None:
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
 
 class QueryConverter:
-    def __init__(self) -> None:
-        self._qcache: dict[CacheKey, CacheValue] = {}
+    def __init__(self, cache: Optional[QueryCache] = None) -> None:
+        self._qcache = QueryCache() if cache is None else cache
 
     def convert(self, query: str, params: Any, paramstyle: str) -> tuple[str, Params]:
         "Convert query and params from vendor-neutral to database-specific form."
-        key = CacheKey(query, paramstyle)
-        if key in self._qcache:
-            cached = self._qcache[key]
-        else:
-            cached = self._qcache[key] = _CONVERTERS[paramstyle](query, params)
-        return self._convert(cached, params, _INITIALS[paramstyle], _APPENDERS[paramstyle])
+        if _param_free(query):
+            return (query, _INITIALS[paramstyle]())
+        cached = self._lookup(query, paramstyle)
+        return (cached.sql, cached.bind(params))
+
+    def compile(self, query: str, paramstyle: str) -> CacheValue:
+        "Convert query to database-specific form, for binding parameters to later."
+        if _param_free(query):
+            return CacheValue([query], [], _INITIALS[paramstyle])
+        return self._lookup(query, paramstyle)
 
-    def _convert(self, cached: CacheValue, params: Any, initial_params: Callable[[], Params], append_params: Appender) -> tuple[str, Params]:
-        returned_params = initial_params()
-        for name in cached.names:
-            # Not a problem due to program logic, but Mypy is too stupid
-            # to understand that.
-            append_params(returned_params, params, name)  # type: ignore
-        return (cached.sql, returned_params)
+    def _lookup(self, query: str, paramstyle: str) -> CacheValue:
+        key = CacheKey(query, paramstyle)
+        cached = self._qcache.get(key)
+        if cached is None:
+            # Done without holding any lock. Two threads may occasionally
+            # both convert the same query, which is harmless.
+            cached = compile_query(query, paramstyle)
+            self._qcache.put(key, cached)
+        return cached
 
 # F u n c t i o n s
 
-def _positional(query: str, params: Any, repl: str) -> CacheValue:
-    rquery = []
-    rnames = []
-    for token in tlexer(query):
-        if token.is_param:
-            rquery.append(repl)
-            rnames.append(_getname(token.value))
-        else:
-            rquery.append(token.value)
-    return CacheValue(rquery, rnames)
+def compile_query(query: str, paramstyle: str) -> CacheValue:
+    "Convert query to database-specific form, bypassing any cache."
+    return _CONVERTERS[paramstyle](query)
 
-# XXX - PEP0249 never explicitly mentions it, but the parameters in this
-# style apparently use 1-based indexing. See:
-# https://github.com/python/cpython/issues/99953
-def _numeric(query: str, params: Any) -> CacheValue:
+def _column(name: str, column: Any) -> Sequence[Any]:
+    if hasattr(column, '__len__'):
+        return column
+    try:
+        return memoryview(column)
+    except TypeError:
+        raise TypeError(f"Column {name!r} is not a sequence.") from None
+
+# A query without so much as a colon followed by a word character cannot
+# contain a parameter, so there is no need to lex it; it can be passed on
+# to the database as is. Such queries (DDL, maintenance commands, simple
+# selects) tend to be issued over and over, so remember the verdict.
+
+_PARAM_START = re.compile(r':\w')
+
+@lru_cache(maxsize=1024)
+def _param_free(query: str) -> bool:
+    return _PARAM_START.search(query) is None
+
+# The converters copy the unchanged stretches of the query between edits
+# verbatim; the only edits are to parameters and to any whitespace that
+# is not already a single space.
+
+_EDITS = frozenset(["param", "white"])
+
+def _edits(query: str, replace: Callable[[str], str]) -> tuple[list[str], list[str]]:
     rquery: list[str] = []
     rnames: list[str] = []
-    index: MutableMapping[str, str] = {}
-    for token in tlexer(query):
-        if token.is_param:
-            name = _getname(token.value)
-            if name not in index:
-                index[name] = str(len(rnames) + 1)
-                rnames.append(name)
-            rquery.append(':' + index[name])
-        else:
-            rquery.append(token.value)
-    return CacheValue(rquery, rnames)
-
-def _named(query: str, params: Any, prefix: str, suffix: str) -> CacheValue:
-    rquery = []
-    rnames = []
-    for token in tlexer(query):
-        if token.is_param:
-            name = _getname(token.value)
+    last = 0
+    for start, end, kind in tspans(query, kinds=_EDITS):
+        if kind == "param":
+            name = query[start+1:end]
+            rquery.append(query[last:start])
+            rquery.append(replace(name))
             rnames.append(name)
-            rquery.append(prefix + name + suffix)
+        elif end - start > 1 or query[start] != " ":
+            rquery.append(query[last:start])
+            rquery.append(" ")
         else:
-            rquery.append(token.value)
-    return CacheValue(rquery, rnames)
-
-def _getname(cname: str) -> str:
-    assert cname.startswith(':')
-    return cname[1:]
+            continue
+        last = end
+    rquery.append(query[last:])
+    return (rquery, rnames)
 
-def _getparam(params: Any, name: str) -> Any:
-    if isinstance(params, Mapping):
-        return params[name]
-    else:
-        return getattr(params, name)
+def _positional(query: str, repl: str) -> CacheValue:
+    return CacheValue(*_edits(query, lambda name: repl), list)
 
-def _to_list(accum: MutableSequence[Any], params: Any, name: str) -> None:
-    accum.append(_getparam(params, name))
+# XXX - PEP0249 never explicitly mentions it, but the parameters in this
+# style apparently use 1-based indexing. See:
+# https://github.com/python/cpython/issues/99953
+def _numeric(query: str) -> CacheValue:
+    index: dict[str, str] = {}
+    def replace(name: str) -> str:
+        if name not in index:
+            index[name] = ':' + str(len(index) + 1)
+        return index[name]
+    rquery, rnames = _edits(query, replace)
+    return CacheValue(rquery, list(index), list)
 
-def _to_dict(accum: MutableMapping[str, Any], params: Any, name: str) -> None:
-    if name not in accum:
-        accum[name] = _getparam(params, name)
+def _named(query: str, prefix: str, suffix: str) -> CacheValue:
+    return CacheValue(*_edits(query, lambda name: prefix + name + suffix), dict)
 
 # Can only be defined after all internal functions are fully defined.
 
-type Appender = Callable[[MutableSequence[Any], Any, str], None] | Callable[[MutableMapping[str, Any], Any, str], None]
-
-_APPENDERS: Mapping[str, Appender] = {
-    'qmark': _to_list,
-    'format': _to_list,
-    'numeric': _to_list,
-    'named': _to_dict,
-    'pyformat': _to_dict
-}
-
-type Converter = Callable[[str, Params], CacheValue]
+type Converter = Callable[[str], CacheValue]
 
 _CONVERTERS: Mapping[str, Converter] = {
-    'qmark': lambda q, p: _positional(q, p, '?'),
-    'format': lambda q, p: _positional(q, p, '%s'),
+    'qmark': lambda q: _positional(q, '?'),
+    'format': lambda q: _positional(q, '%s'),
     'numeric': _numeric,
-    'named': lambda q, p: _named(q, p, ':', ''),
-    'pyformat': lambda q, p: _named(q, p, '%(', ')s')
+    'named': lambda q: _named(q, ':', ''),
+    'pyformat': lambda q: _named(q, '%(', ')s')
 }
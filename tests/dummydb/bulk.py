@@ -0,0 +1,97 @@
+# Stand-ins for the bulk loading (and key returning) facilities of
+# particular connectors. Each records what it was asked to do, like
+# everything else in dummydb.
+
+from contextlib import contextmanager
+import re
+
+from .common import Connection as BaseConnection, Cursor as BaseCursor, _log_use
+
+apilevel = "1.0"
+threadsafety = 0
+paramstyle = "qmark"
+
+class Copy:
+    def __init__(self):
+        self.rows = []
+
+    def write_row(self, row):
+        self.rows.append(tuple(row))
+
+# Like psycopg.
+class CopyCursor(BaseCursor):
+    @contextmanager
+    def copy(self, statement):
+        copy = Copy()
+        yield copy
+        _log_use("cursor copy", statement=statement, rows=copy.rows)
+
+# Like pyodbc.
+class FastCursor(BaseCursor):
+    def __init__(self):
+        super().__init__()
+        self.fast_executemany = False
+
+    def executemany(self, operation, seq_of_parameters):
+        _log_use("cursor executemany", operation=operation, seq_of_parameters=seq_of_parameters,
+            fast_executemany=self.fast_executemany)
+
+# Like mysql.connector, with local infiles allowed.
+class InfileCursor(BaseCursor):
+    def execute(self, operation, parameters=None, prepare=None):
+        match = re.search(r"local infile '([^']*)'", operation)
+        with open(match[1], encoding="utf-8", newline="") as fp:
+            _log_use("cursor execute", operation=operation, infile=fp.read())
+
+# Like oracledb, or anything else: array DML is plain executemany.
+class ArrayCursor(BaseCursor):
+    def executemany(self, operation, seq_of_parameters):
+        _log_use("cursor executemany", operation=operation, seq_of_parameters=seq_of_parameters)
+
+class Connection(BaseConnection):
+    def __init__(self, cursor_class=BaseCursor):
+        self.cursor_class = cursor_class
+
+    def cursor(self):
+        _log_use("connection cursor")
+        return self.cursor_class()
+
+def connect(*args, **kwargs):
+    return Connection()
+
+# Like psycopg, which can pipeline many statements and keep each one's
+# results. Each statement returns its (named) parameter values, less the
+# first.
+class PipelineCursor(BaseCursor):
+    def executemany(self, operation, seq_of_parameters, returning=False):
+        _log_use("cursor executemany", operation=operation, seq_of_parameters=seq_of_parameters, returning=returning)
+        self._results = [ tuple(x.values())[1:] for x in seq_of_parameters ]
+
+    def fetchone(self):
+        return self._results[0]
+
+    def nextset(self):
+        del self._results[0]
+        return True if self._results else None
+
+# Like oracledb, which returns values into arrays. Returns 100 plus the
+# number of the row.
+class Var:
+    def __init__(self, type, arraysize):
+        self.values = [ [] for i in range(arraysize) ]
+
+    def getvalue(self, pos):
+        return self.values[pos]
+
+class ReturningCursor(BaseCursor):
+    def var(self, type, arraysize=1):
+        return Var(type, arraysize)
+
+    def setinputsizes(self, **kwargs):
+        self._vars = kwargs
+
+    def executemany(self, operation, seq_of_parameters):
+        _log_use("cursor executemany", operation=operation, seq_of_parameters=seq_of_parameters)
+        for var in self._vars.values():
+            for i in range(len(seq_of_parameters)):
+                var.values[i].append(100 + i)
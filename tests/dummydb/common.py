@@ -69,7 +69,8 @@ class Cursor:
     def close(self) -> None:
         _log_use("cursor close")
 
-    def execute(self, operation: str, parameters: Sequence | Mapping | None = None) -> Optional[Any]:
+    # Only psycopg accepts prepare, but no harm in letting all accept it.
+    def execute(self, operation: str, parameters: Sequence | Mapping | None = None, prepare: Optional[bool] = None) -> Optional[Any]:
         _log_use("cursor execute", **locals())
         return RESULTS.execute.pop()
 
@@ -85,7 +86,19 @@ class Cursor:
         if size < 0:
             size = self.arraysize
         _log_use("cursor fetchmany", **locals())
-        return RESULTS.fetchmany.pop()
+        if RESULTS.fetchmany:
+            return RESULTS.fetchmany.pop()
+        # Otherwise, take rows from those queued for fetchone, leaving the
+        # terminating None (if reached) to end the next call.
+        rows = []
+        while len(rows) < size:
+            row = RESULTS.fetchone.pop()
+            if row is None:
+                if rows:
+                    RESULTS.fetchone.append(None)
+                break
+            rows.append(row)
+        return rows
 
     def fetchall(self) -> Sequence[Sequence] | Sequence:
         _log_use("cursor fetchall")
@@ -0,0 +1,58 @@
+# Test what importing the package costs. Programs that only import it
+# (short-lived command-line jobs, serverless cold starts) should not pay
+# for the lexer machinery.
+
+# I m p o r t s
+
+import subprocess
+import sys
+import unittest
+
+# V a r i a b l e s
+
+# Cumulative import time budget for the package, in microseconds. Typically
+# about 40 ms; this allows for slow or busy machines, but not for much more.
+BUDGET = 100_000
+
+# Modules only some features need, which importing the package must not
+# import (unless something else already has).
+DEFERRED = [ "abnormal.ply", "concurrent.futures", "multiprocessing", "numpy", "tempfile" ]
+
+# Prints the modules importing the package adds.
+ADDED = "import sys; before = set(sys.modules); import abnormal; print(*sorted(set(sys.modules) - before))"
+
+# T e s t s
+
+class TestImport(unittest.TestCase):
+    def setUp(self):
+        result = subprocess.run([ sys.executable, "-X", "importtime", "-c", "import abnormal" ],
+            capture_output=True, text=True, check=True)
+        # Lines look like: "import time:  self [us] | cumulative | name"
+        self.times = {}
+        for line in result.stderr.splitlines():
+            fields = line.removeprefix("import time:").split("|")
+            if len(fields) == 3 and fields[1].strip().isdigit():
+                self.times[fields[2].strip()] = int(fields[1])
+
+    def test_lazy_ply(self):
+        self.assertIn("abnormal.tlexer", self.times)
+        self.assertNotIn("abnormal.ply", self.times)
+        self.assertNotIn("abnormal.ply.lex", self.times)
+
+    def test_lazy_numpy(self):
+        self.assertNotIn("numpy", self.times)
+
+    def test_deferred(self):
+        result = subprocess.run([ sys.executable, "-c", ADDED ], capture_output=True, text=True, check=True)
+        added = set(result.stdout.split())
+        self.assertIn("abnormal.tlexer", added)
+        for name in DEFERRED:
+            self.assertNotIn(name, added)
+
+    def test_budget(self):
+        self.assertLess(self.times["abnormal"], BUDGET)
+
+# M a i n   P r o g r a m
+
+if __name__ == '__main__':
+    unittest.main()
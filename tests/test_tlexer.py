@@ -1,6 +1,9 @@
 # I m p o r t s
 
 import abnormal.tlexer as tlexer
+from abnormal.exceptions import SqlError
+import random
+import time
 import unittest
 
 # T e s t s
@@ -17,16 +20,18 @@ class TestTlexer(unittest.TestCase):
             tlexer.SqlToken(" ", False), tlexer.SqlToken("suppliers", False) ]
         self._vqueries(queries, expected)
 
+    # Every engine must produce exactly the same output.
     def _vqueries(self, queries, expected):
-        for query in queries:
-            result = list(tlexer.tlexer(query))
-            for i in range(len(result)):
-                self.assertTrue(i < len(expected),
-                    f"query = {query!r}, overly long result!")
-                self.assertEqual(result[i], expected[i],
-                    f"query = {query!r}, token = {i}")
-            self.assertEqual(len(result), len(expected),
-                f"query = {query!r}, runt result!")
+        for engine in tlexer._ENGINES:
+            for query in queries:
+                result = list(tlexer.tlexer(query, engine))
+                for i in range(len(result)):
+                    self.assertTrue(i < len(expected),
+                        f"engine = {engine}, query = {query!r}, overly long result!")
+                    self.assertEqual(result[i], expected[i],
+                        f"engine = {engine}, query = {query!r}, token = {i}")
+                self.assertEqual(len(result), len(expected),
+                    f"engine = {engine}, query = {query!r}, runt result!")
 
     def test_comments(self):
         "Both C and SQL style comments map to whitespace."
@@ -158,6 +163,75 @@ class TestTlexer(unittest.TestCase):
             tlexer.SqlToken(' ', False), tlexer.SqlToken("'O''Brien'", False)]
         self._vqueries([query], expected)
 
+    def test_interleaved(self):
+        "Lexers are cloned from one prototype, but must not share state."
+        g1 = tlexer.tlexer("select :a", "ply")
+        g2 = tlexer.tlexer("update t", "ply")
+        self.assertEqual(next(g1), tlexer.SqlToken("select", False))
+        self.assertEqual(next(g2), tlexer.SqlToken("update", False))
+        self.assertEqual(list(g1), [ tlexer.SqlToken(" ", False), tlexer.SqlToken(":a", True) ])
+        self.assertEqual(list(g2), [ tlexer.SqlToken(" ", False), tlexer.SqlToken("t", False) ])
+        self.assertIsNotNone(tlexer._prototype)
+
+    def test_errors(self):
+        for engine in tlexer._ENGINES:
+            with self.assertRaises(SqlError) as cm:
+                list(tlexer.tlexer("select * from t where a = $1", engine))
+            self.assertEqual(str(cm.exception), "bad SQL at offset 26")
+        self.assertRaises(ValueError, tlexer.tlexer, "select 1", "bogus")
+
+    def test_parity_random(self):
+        "Engines must agree on arbitrary junk, errors included."
+        pieces = [ "select", " ", "\n", ":p", ":", "'", "''", '"', '""', "`",
+            "\\", "--", "/*", "*/", "<>", "||", "en_US'", "x", "(", ",", "$" ]
+        rng = random.Random(249)
+        for i in range(500):
+            query = "".join(rng.choices(pieces, k=rng.randint(1, 20)))
+            self.assertEqual(self._lex_or_error(query, "regex"), self._lex_or_error(query, "ply"),
+                f"query = {query!r}")
+
+    def _lex_or_error(self, query, engine):
+        try:
+            return list(tlexer.tlexer(query, engine))
+        except SqlError as e:
+            return str(e)
+
+    def test_spans(self):
+        query = "select  *\n-- all\nfrom t where a = :a"
+        for engine in tlexer._ENGINES:
+            spans = list(tlexer.tspans(query, engine))
+            self.assertEqual(spans[0], (0, 6, "ident"))
+            self.assertEqual(spans[1], (6, 8, "white"))
+            self.assertEqual(spans[3], (9, 17, "white"))
+            self.assertEqual(spans[-1], (len(query) - 2, len(query), "param"))
+            self.assertEqual([ " " if k == "white" else query[s:e] for s, e, k in spans ],
+                [ t.value for t in tlexer.tlexer(query, engine) ])
+            self.assertEqual(list(tlexer.tspans(query, engine, kinds={"param"})),
+                [ spans[-1] ])
+
+    def test_adversarial(self):
+        "The default engine must take linear time, however nasty the input."
+        cases = [
+            ("unterminated backslashes", lambda n: "select '" + "\\\\" * n, True),
+            ("unterminated escaped quotes", lambda n: "select '" + "\\'" * n, False),
+            ("unterminated identifier", lambda n: 'select "' + "\\\\" * n, True),
+            ("open comments", lambda n: "select " + "/* " * n, False),
+            ("open comments, closed on next line", lambda n: "/* " * n + "\n*/", False),
+            ("huge literal", lambda n: "select '" + "x" * n + "'", False) ]
+        for name, make, fails in cases:
+            small = make(12)
+            self.assertEqual(self._lex_or_error(small, "regex"), self._lex_or_error(small, "ply"),
+                f"case = {name}")
+            big = make(200_000)
+            start = time.perf_counter()
+            result = self._lex_or_error(big, tlexer.DEFAULT_ENGINE)
+            elapsed = time.perf_counter() - start
+            self.assertEqual(isinstance(result, str), fails, f"case = {name}")
+            self.assertLess(elapsed, 10.0, f"case = {name}")
+
+    def test_default_engine(self):
+        self.assertIn(tlexer.DEFAULT_ENGINE, tlexer._ENGINES)
+
     def _mktokens(self, seq, is_param=False):
         return [ tlexer.SqlToken(x, is_param) for x in seq ]
 
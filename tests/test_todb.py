@@ -1,11 +1,21 @@
 # I m p o r t s
 
 import unittest
+from array import array
 from dataclasses import dataclass
-from abnormal.todb import QueryConverter
+from abnormal.exceptions import IncompleteDataError
+from abnormal.todb import CacheKey, QueryCache, QueryConverter
 
 # C l a s s e s
 
+class BufferOnly:
+    "Exposes the buffer protocol, and nothing else."
+    def __init__(self, data):
+        self._data = data
+
+    def __buffer__(self, flags):
+        return memoryview(self._data)
+
 @dataclass
 class Suppliers:
     sno: str
@@ -81,6 +91,68 @@ class TestTodb(unittest.TestCase):
         self.assertEqual(result[0], "select * from suppliers where sno = %(sno)s")
         self.assertEqual(result[1], { 'sno': _STDOBJ.sno })
 
+    def test_spans(self):
+        "Unchanged text is copied as is, but whitespace is still normalized."
+        query = "select  *\n  from suppliers -- the lot\n where sno = :sno and name <> ':sno' /* ? */"
+        result = self.converter.convert(query, _STDREC, 'numeric')
+        self.assertEqual(result[0], "select * from suppliers where sno = :1 and name <> ':sno' ")
+        self.assertEqual(result[1], [_STDOBJ.sno])
+
+    def test_numeric_repeats(self):
+        query = "select * from suppliers where sno = :sno or name = :name or sno = :sno"
+        result = self.converter.convert(query, _STDREC, 'numeric')
+        self.assertEqual(result[0], "select * from suppliers where sno = :1 or name = :2 or sno = :1")
+        self.assertEqual(result[1], [_STDOBJ.sno, _STDOBJ.name])
+
+    def test_param_free(self):
+        "Queries that cannot contain parameters pass straight through."
+        query = "select *\nfrom suppliers -- everything"
+        for paramstyle, empty in [ ('qmark', []), ('format', []), ('numeric', []), ('named', {}), ('pyformat', {}) ]:
+            result = self.converter.convert(query, _STDREC, paramstyle)
+            self.assertIs(result[0], query)
+            self.assertEqual(result[1], empty)
+        self.assertEqual(len(self.converter._qcache), 0)
+        # A colon alone is not enough to make a query worth lexing...
+        self.assertEqual(self.converter.convert("select 'a: b'", _STDREC, 'qmark')[0], "select 'a: b'")
+        self.assertEqual(len(self.converter._qcache), 0)
+        # ...but a colon followed by a word is.
+        self.assertEqual(self.converter.convert("select ':b'", _STDREC, 'qmark')[0], "select ':b'")
+        self.assertEqual(len(self.converter._qcache), 1)
+
+    def test_binders(self):
+        "Each class of data source gets its own compiled binder."
+        query = "select * from suppliers where sno = :sno or name = :name or sno = :sno"
+        self.assertEqual(self.converter.convert(query, _STDREC, 'named')[1],
+            { 'sno': _STDOBJ.sno, 'name': _STDOBJ.name })
+        self.assertEqual(self.converter.convert(query, _STDOBJ, 'named')[1],
+            { 'sno': _STDOBJ.sno, 'name': _STDOBJ.name })
+        self.assertEqual(self.converter.convert(query, _STDOBJ, 'qmark')[1],
+            [_STDOBJ.sno, _STDOBJ.name, _STDOBJ.sno])
+        cached = self.converter._qcache.get(CacheKey(query, 'named'))
+        self.assertEqual(set(cached._binders), { dict, Suppliers })
+        # Binders must not hand out the same container twice.
+        r1 = self.converter.convert(_Q2, _STDREC, 'qmark')[1]
+        r2 = self.converter.convert(_Q2, _STDREC, 'qmark')[1]
+        self.assertIsNot(r1, r2)
+
+    def test_bind_columns(self):
+        query = "select * from suppliers where sno = :sno or name = :name or sno = :sno"
+        columns = { 'sno': array('i', [ 1, 2 ]), 'name': [ "Smith", "Jones" ], 'city': BufferOnly(b"LP") }
+        self.assertEqual(list(self.converter.compile(query, 'qmark').bind_columns(columns)),
+            [ (1, "Smith", 1), (2, "Jones", 2) ])
+        self.assertEqual(list(self.converter.compile(query, 'named').bind_columns(columns)),
+            [ { 'sno': 1, 'name': "Smith" }, { 'sno': 2, 'name': "Jones" } ])
+        self.assertEqual(list(self.converter.compile("select * from suppliers where city = :city", 'named').bind_columns(columns)),
+            [ { 'city': ord("L") }, { 'city': ord("P") } ])
+        self.assertEqual(list(self.converter.compile("delete from suppliers", 'qmark').bind_columns(columns)),
+            [ [], [] ])
+        self.assertRaises(IncompleteDataError, self.converter.compile(query, 'qmark').bind_columns,
+            { 'sno': [ 1, 2 ], 'name': [ "Smith" ] })
+        self.assertRaises(IncompleteDataError, self.converter.compile(query, 'qmark').bind_columns,
+            { 'sno': [ 1, 2 ] })
+        self.assertRaises(TypeError, self.converter.compile(query, 'qmark').bind_columns,
+            { 'sno': iter([ 1, 2 ]), 'name': [ "Smith", "Jones" ] })
+
     def test_badrefs(self):
         query = "select * from suppliers where sno = :gunk"
         self.assertRaises(AttributeError, self.converter.convert, query, _STDOBJ, 'qmark')
@@ -97,6 +169,34 @@ class TestTodb(unittest.TestCase):
         self.assertEqual(len(self.converter._qcache), after)
         self.assertEqual(result1, result2)
 
+    def test_shared_cache(self):
+        cache = QueryCache()
+        c1 = QueryConverter(cache)
+        c2 = QueryConverter(cache)
+        c1.convert(_Q2, _STDREC, 'qmark')
+        c2.convert(_Q2, _STDREC, 'qmark')
+        c2.convert(_Q2, _STDREC, 'named')
+        stats = cache.stats()
+        self.assertEqual((stats.hits, stats.misses, stats.size), (1, 2, 2))
+
+    def test_lru(self):
+        cache = QueryCache(maxsize=2)
+        converter = QueryConverter(cache)
+        q3 = "select * from parts where pno = :pno"
+        converter.convert(_Q1, _STDREC, 'qmark')
+        converter.convert(_Q2, _STDREC, 'qmark')
+        converter.convert(_Q1, _STDREC, 'qmark')  # _Q2 now least recently used
+        converter.convert(q3, { 'pno': 'p1' }, 'qmark')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get(CacheKey(_Q2, 'qmark')))
+        self.assertIsNotNone(cache.get(CacheKey(_Q1, 'qmark')))
+        cache.maxsize = 1
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.evictions, 2)
+        self.assertIsNotNone(cache.get(CacheKey(_Q1, 'qmark')))
+        self.assertRaises(ValueError, QueryCache, 0)
+
 # M a i n   P r o g r a m
 
 if __name__ == '__main__':
@@ -4,11 +4,25 @@
 
 import os, sys
 
+from functools import partial
+
 import sqlite3
+from array import array
+import tempfile
+import threading
 import unittest
-from dataclasses import dataclass
+from unittest import mock
+from dataclasses import astuple, dataclass
+from pathlib import Path
+from typing import NamedTuple
+
+from abnormal import connect, load_queries, mapping, namespace, parallel_load, QueryCache, record, scalar, sequence, Error, IncompleteDataError, InterfaceError, LoadError, NotSupportedError, SqlError, UnexpectedResultError
+from abnormal.batch import rows_per_statement
 
-from abnormal import connect, mapping, scalar, sequence, Error, UnexpectedResultError
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # C l a s s e s
 
@@ -19,10 +33,49 @@ class Suppliers:
     status: int
     city: str
 
+class SupplierTuple(NamedTuple):
+    sno: int
+    name: str
+    status: int
+    city: str
+
+# Fails to roll back or close, as a connection to a lost server would.
+class LostConnection(sqlite3.Connection):
+    def rollback(self):
+        super().rollback()
+        raise sqlite3.OperationalError("connection lost")
+
+    def close(self):
+        super().close()
+        raise sqlite3.OperationalError("connection lost")
+
+# Neither can be passed back from a worker process as is: the one holds a
+# lock, which cannot be pickled, and the other cannot be unpickled.
+class LockedError(Exception):
+    def __init__(self):
+        super().__init__("locked")
+        self.lock = threading.Lock()
+
+class TwoPartError(Exception):
+    def __init__(self, first, second):
+        super().__init__(f"{first} {second}")
+
 # V a r i a b l e s
 
 DBFILE = "e2e.db"
 
+# F u n c t i o n s
+
+# Picklable, so usable by parallel_load in worker processes.
+def connect_e2e():
+    return connect(sqlite3, DBFILE, timeout=30)
+
+def connect_locked():
+    raise LockedError()
+
+def connect_two_part():
+    raise TwoPartError("two", "parts")
+
 # T e s t s
 
 class TestEndToEnd(unittest.TestCase):
@@ -92,6 +145,340 @@ class TestEndToEnd(unittest.TestCase):
         results = list(self.conn.execute("select * from suppliers where city = 'Moscow'").into(Suppliers))
         self.assertEqual(len(results), 0)
 
+    def test_into_batches(self):
+        self.conn.insert_into("suppliers").from_sources(Suppliers(sno, "Smith", 20, "Rome") for sno in range(6, 3006))
+        curs = self.conn.execute("select * from suppliers where city = 'Rome' order by sno")
+        batches = list(curs.into_batches(Suppliers, 1000))
+        self.assertEqual([ len(x) for x in batches ], [ 1000, 1000, 1000 ])
+        self.assertEqual(batches[2][-1], Suppliers(3005, "Smith", 20, "Rome"))
+        # Adaptive block sizes must not lose or repeat rows.
+        snos = list(self.conn.execute("select sno from suppliers order by sno").into(scalar))
+        self.assertEqual(snos, list(range(1, 3006)))
+
+    def test_record(self):
+        rows = list(self.conn.execute("select sno, name, count(*), sno from suppliers group by sno order by sno").into(record))
+        self.assertEqual(rows[0], (1, "Smith", 1, 1))
+        self.assertEqual((rows[1].sno, rows[1].name, rows[1]._2, rows[1]._3), (2, "Jones", 1, 2))
+        self.assertFalse(hasattr(rows[0], "__dict__"))
+        # One class per distinct set of column names.
+        self.assertIs(type(rows[0]), type(rows[4]))
+        other = self.conn.execute("select city from suppliers where sno = 1").into1(record)
+        self.assertEqual(other.city, "London")
+        self.assertIsNot(type(other), type(rows[0]))
+        self.assertIs(type(self.conn.execute("select * from suppliers where sno = 1").into1(record)),
+            type(self.conn.execute("select * from suppliers where sno = 2").into1(record)))
+        self.assertEqual(record(a=1, b=2).b, 2)
+
+    def test_into_columns(self):
+        query = "select sno, name, status * 1.5 as score, null as empty from suppliers order by sno"
+        columns = self.conn.execute(query).into_columns()
+        self.assertEqual(list(columns), [ "sno", "name", "score", "empty" ])
+        self.assertEqual(columns["sno"], [ 1, 2, 3, 4, 5 ])
+        self.assertEqual(columns["empty"], [ None ] * 5)
+        self.assertEqual(columns.nulls, {})
+        self.conn.execute("update suppliers set status = null where sno = 2")
+        self.conn.insert_into("suppliers").from_sources(Suppliers(sno, "Smith", 20, "Rome") for sno in range(6, 3006))
+        columns = self.conn.execute(query).into_columns(typed=True)
+        self.assertEqual(columns["sno"], array('q', range(1, 3006)))
+        self.assertEqual(columns["score"].typecode, 'd')
+        self.assertEqual(columns["score"][:3].tolist(), [ 30.0, 0.0, 45.0 ])
+        self.assertEqual(columns.nulls["score"][:3], bytearray([ 0, 1, 0 ]))
+        self.assertEqual(columns.nulls["sno"], bytearray(3005))
+        self.assertIsInstance(columns["name"], list)
+        self.assertEqual(columns["empty"], [ None ] * 3005)
+        # Columns of the same name cannot be told apart.
+        for typed in [ False, True ]:
+            curs = self.conn.execute("select a.sno, b.sno, a.name from suppliers a join suppliers b on a.sno = b.sno")
+            with self.assertRaises(InterfaceError) as cm:
+                curs.into_columns(typed)
+            self.assertIn("sno", str(cm.exception))
+        # A column that stops fitting its array becomes a list.
+        columns = self.conn.execute("select case sno when 3005 then 1e20 else sno end as sno from suppliers order by sno").into_columns(typed=True)
+        self.assertEqual(columns["sno"][-1], 1e20)
+        self.assertIsInstance(columns["sno"], list)
+        self.assertEqual(columns.nulls, {})
+        # As does a floating point column given an integer floats cannot hold.
+        columns = self.conn.execute("select case sno when 3005 then 9007199254740993 else sno * 0.5 end as x from suppliers order by sno").into_columns(typed=True)
+        self.assertEqual(columns["x"][-1], 9007199254740993)
+        self.assertIsInstance(columns["x"], list)
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_into_numpy(self):
+        self.conn.execute("update suppliers set status = null where sno = 2")
+        query = "select sno, name, status, status * 1.5 as score from suppliers order by sno"
+        records = self.conn.execute(query).into_numpy()
+        self.assertEqual(records.dtype.names, ("sno", "name", "status", "score"))
+        self.assertEqual(records["sno"].tolist(), [ 1, 2, 3, 4, 5 ])
+        self.assertEqual(records["sno"].dtype, numpy.int64)
+        self.assertEqual(records["name"][4], "Adams")
+        # Nulls make an integer column floating point.
+        self.assertTrue(numpy.isnan(records["status"][1]))
+        self.assertEqual(records["score"][2], 45.0)
+        columns = self.conn.execute(query).into_numpy(dtype=[ ("sno", "i4"), ("name", "O"), ("status", "f4"), ("score", "f8") ], columns=True)
+        self.assertEqual(list(columns), [ "sno", "name", "status", "score" ])
+        self.assertEqual(columns["sno"].dtype, numpy.int32)
+        self.assertEqual(columns["name"].dtype, object)
+        self.assertTrue(numpy.isnan(columns["status"][1]))
+        with self.assertRaises(IncompleteDataError):
+            self.conn.execute(query).into_numpy(dtype=[ ("sno", "i4"), ("name", "O") ])
+        # Nulls are None in object columns, and not allowed in integer ones.
+        columns = self.conn.execute(query).into_numpy(dtype=object, columns=True)
+        self.assertEqual(columns["status"].tolist(), [ 20, None, 30, 20, 30 ])
+        self.assertRaises(UnexpectedResultError, self.conn.execute("select sno, status from suppliers").into_numpy, dtype="i8")
+        empty = self.conn.execute("select sno from suppliers where sno > 99").into_numpy()
+        self.assertEqual(len(empty), 0)
+
+    @unittest.skipIf(numpy, "NumPy is installed")
+    def test_into_numpy_missing(self):
+        curs = self.conn.execute("select * from suppliers")
+        self.assertRaises(NotSupportedError, curs.into_numpy)
+        # Nothing was consumed.
+        self.assertEqual(len(list(curs.into(Suppliers))), 5)
+
+    def test_shared_cache(self):
+        query = "select name from suppliers where sno = :sno"
+        before = self.conn.query_cache.stats()
+        self.assertEqual(self.conn.execute(query, { 'sno': 1 }).into1(scalar), "Smith")
+        self.assertEqual(self.conn.cursor().execute(query, { 'sno': 2 }).into1(scalar), "Jones")
+        after = self.conn.query_cache.stats()
+        self.assertEqual(after.misses - before.misses, 1)
+        self.assertEqual(after.hits - before.hits, 1)
+
+    def test_prepare(self):
+        q = self.conn.prepare("select name from suppliers where city = :city order by sno")
+        self.assertEqual(q.sql, "select name from suppliers where city = ? order by sno")
+        self.assertEqual(list(q.into(scalar, { 'city': 'Paris' })), ["Jones", "Blake"])
+        curs = self.conn.cursor()
+        self.assertIs(q.execute({ 'city': 'Athens' }, curs), curs)
+        self.assertEqual(curs.into1(scalar), "Adams")
+        self.assertRaises(AttributeError, setattr, q, "query", "drop table suppliers")
+        before = self.conn.query_cache.stats()
+        for i in range(3):
+            self.assertEqual(q.into1(scalar, { 'city': 'Athens' }), "Adams")
+        self.assertEqual(self.conn.query_cache.stats(), before)
+
+    def test_prepare_executemany(self):
+        q = self.conn.prepare("insert into suppliers (sno, name, status, city) values (:sno, :name, :status, :city)")
+        q.executemany([ Suppliers(6, "Herrera", 15, "Madrid"), Suppliers(7, "Schmidt", 15, "Berlin") ])
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 7)
+
+    def test_executemany_streaming(self):
+        rows = ( Suppliers(sno, "Smith", 20, "London") for sno in range(6, 10_006) )
+        self.conn.executemany("insert into suppliers (sno, name, status, city) values (:sno, :name, :status, :city)", rows)
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 10_005)
+        q = self.conn.prepare("delete from suppliers where sno = :sno")
+        q.executemany(({ 'sno': sno } for sno in range(6, 10_006)), chunk_size=999)
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 5)
+
+    def test_executemany_columns(self):
+        n = 1000
+        columns = { 'sno': array('q', range(6, n + 6)), 'name': [ "Smith" ] * n, 'status': array('i', [ 20 ]) * n }
+        self.conn.executemany_columns("insert into suppliers (sno, name, status) values (:sno, :name, :status)", columns, chunk_size=300)
+        self.assertEqual(self.conn.execute("select count(*), sum(status) from suppliers where name = 'Smith'").into1(sequence),
+            (n + 1, 20 * (n + 1)))
+        self.assertRaises(IncompleteDataError, self.conn.executemany_columns,
+            "insert into suppliers (sno, name) values (:sno, :name)", { 'sno': [ 7000 ], 'name': [] })
+
+    def test_executemany_rowcount(self):
+        curs = self.conn.cursor()
+        rows = [ { 'sno': sno, 'name': "Smith" } for sno in range(6, 1006) ]
+        with mock.patch.object(self.conn._driver, "lazy_executemany", False), mock.patch("abnormal._CHUNK_SIZE", 400):
+            curs.executemany("insert into suppliers (sno, name) values (:sno, :name)", rows)
+        self.assertEqual(curs.rowcount, 1000)
+        curs.executemany("delete from suppliers where sno = :sno", rows, chunk_size=300)
+        self.assertEqual(curs.rowcount, 1000)
+        curs.close()
+
+    def test_insert_from_sources(self):
+        rows = ( Suppliers(sno, "Smith", 20, "London") for sno in range(6, 10_006) )
+        self.assertEqual(self.conn.insert_into("suppliers").from_sources(rows, batch_size=4000), [ 4000, 4000, 2000 ])
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 10_005)
+        self.conn.insert_into("suppliers").from_source({ 'sno': 10_006, 'name': "Lopez" })
+        self.assertEqual(self.conn.execute("select name from suppliers where sno = 10006").into1(scalar), "Lopez")
+
+    def test_insert_multirow(self):
+        rows = ( Suppliers(sno, f"Smith {sno}", 20, "London") for sno in range(6, 10_006) )
+        self.assertEqual(self.conn.insert_into("suppliers").from_sources(rows, batch_size=4000, multirow=True),
+            [ 4000, 4000, 2000 ])
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 10_005)
+        self.assertEqual(self.conn.execute("select name from suppliers where sno = 9999").into1(scalar), "Smith 9999")
+        # Multi-row statements stay out of the query cache.
+        before = len(self.conn.query_cache)
+        for n in range(1, 40):
+            self.conn.insert_into("suppliers").from_sources([ Suppliers(20_000 + 100 * n + i, "Jones", 10, "Paris") for i in range(n) ],
+                multirow=True)
+        self.assertEqual(len(self.conn.query_cache), before)
+        # Statements are sized by what the connection allows, here as if
+        # SQLite were older than 3.32.
+        self.conn.raw.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        self.assertEqual(rows_per_statement(self.conn._driver, 4, connection=self.conn.raw), 249)
+        rows = [ Suppliers(sno, "Blake", 30, "Paris") for sno in range(30_000, 31_000) ]
+        self.assertEqual(self.conn.insert_into("suppliers").from_sources(rows, multirow=True), [ 1000 ])
+
+    def test_rewrite_inserts(self):
+        self.conn.rewrite_inserts = True
+        rows = ( Suppliers(sno, f"Smith {sno}", 20, "London") for sno in range(6, 10_006) )
+        curs = self.conn.cursor()
+        curs.executemany("insert into suppliers (sno, name, status, city) values (:sno, :name, :status, upper(:city));", rows)
+        self.assertEqual(curs.rowcount, 10_000)
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 10_005)
+        self.assertEqual(curs.execute("delete from suppliers where sno = 9999").rowcount, 1)
+        curs.executemany("insert into suppliers (sno) values (:sno)", ({ 'sno': sno } for sno in range(20_000, 20_025)), chunk_size=10)
+        self.assertEqual(curs.rowcount, 25)
+        curs.execute("delete from suppliers where sno >= 20000")
+        self.assertRaises(ValueError, curs.executemany, "insert into suppliers (sno) values (:sno)", [ { 'sno': 9999 } ], chunk_size=0)
+        curs.close()
+        self.assertEqual(self.conn.execute("select name, city from suppliers where sno = 9998").into1(sequence),
+            ("Smith 9998", "LONDON"))
+        # Anything else is executed as is.
+        self.conn.executemany("delete from suppliers where sno = :sno", ({ 'sno': sno } for sno in range(6, 10_006)))
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 5)
+
+    def test_update_from_sources(self):
+        rows = [ Suppliers(sno, "Smith", 99, "Rome") for sno in [ 1, 2, 3, 42, 5 ] ]
+        self.assertEqual(self.conn.update("suppliers").from_sources(rows, batch_size=2), [ 2, 1, 1 ])
+        self.assertEqual(set(self.conn.execute("select sno from suppliers where city = 'Rome'").into(scalar)),
+            { 1, 2, 3, 5 })
+        self.assertEqual(self.conn.update("suppliers").excluding("city").from_sources([ rows[3] ]), [ 0 ])
+
+    def test_update_composite_key(self):
+        self.conn.execute("create table shipments ( sno integer not null, pno integer not null, qty integer, primary key (sno, pno) )")
+        self.conn.executemany("insert into shipments (sno, pno, qty) values (:sno, :pno, :qty)",
+            [ { 'sno': s, 'pno': p, 'qty': 0 } for s in range(1, 4) for p in range(1, 4) ])
+        updates = ( { 'sno': 2, 'pno': p, 'qty': 100 + p } for p in range(1, 4) )
+        self.assertEqual(self.conn.update("shipments").from_sources(updates), [ 3 ])
+        self.assertEqual(self.conn.execute("select sum(qty) from shipments").into1(scalar), 306)
+        self.conn.update("shipments").from_source({ 'sno': 3, 'pno': 3, 'qty': 7 })
+        self.assertEqual(self.conn.execute("select sum(qty) from shipments").into1(scalar), 313)
+
+    def test_merge_into(self):
+        self.conn.merge_into("suppliers").from_source(Suppliers(1, "Smith", 99, "Rome"))
+        self.conn.merge_into("suppliers").from_source(Suppliers(6, "Herrera", 15, "Madrid"))
+        self.assertEqual(self.conn.execute("select status, city from suppliers where sno = 1").into1(sequence), (99, "Rome"))
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 6)
+        rows = ( Suppliers(sno, "Smith", sno, "Oslo") for sno in range(4, 10) )
+        self.assertEqual(self.conn.merge_into("suppliers").from_sources(rows, batch_size=4), [ 4, 2 ])
+        self.assertEqual(self.conn.execute("select count(*) from suppliers where city = 'Oslo'").into1(scalar), 6)
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 9)
+        self.assertRaises(IncompleteDataError, self.conn.merge_into("suppliers").from_source, { 'name': "Lopez" })
+
+    def test_bulk_load(self):
+        rows = ( { 'SNO': sno, 'Name': "Smith" } for sno in range(6, 1006) )
+        self.assertEqual(self.conn.bulk_load("suppliers", rows, batch_size=400), [ 400, 400, 200 ])
+        self.assertEqual(self.conn.execute("select count(*) from suppliers where name = 'Smith'").into1(scalar), 1001)
+
+    def test_parallel_load(self):
+        self.conn.commit()
+        for processes in [ False, True ]:
+            self.conn.execute("delete from suppliers where sno > 5")
+            self.conn.commit()
+            rows = ( Suppliers(sno, "Smith", 20, "London") for sno in range(6, 2006) )
+            stats = parallel_load(connect_e2e, "suppliers", rows, workers=3, batch_size=150, processes=processes)
+            self.assertEqual(len(stats), 3)
+            self.assertEqual(sum([ x.rows for x in stats ]), 2000)
+            self.assertEqual(sum([ x.batches for x in stats ]), 14)
+            self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 2005)
+
+    def test_parallel_load_error(self):
+        self.conn.commit()
+        rows = [ Suppliers(sno, "Smith", 20, "London") for sno in range(6, 406) ]
+        rows.append(Suppliers(1, "Duplicate", 20, "London"))
+        with self.assertRaises(LoadError) as cm:
+            parallel_load(connect_e2e, "suppliers", rows, workers=2, batch_size=100)
+        self.assertIsInstance(cm.exception.__cause__, sqlite3.IntegrityError)
+        committed = sum([ x.rows for x in cm.exception.stats ])
+        self.assertEqual(self.conn.execute("select count(*) from suppliers").into1(scalar), 5 + committed)
+        self.assertEqual(self.conn.execute("select count(*) from suppliers where name = 'Duplicate'").into1(scalar), 0)
+
+    def test_parallel_load_unpicklable(self):
+        self.assertRaises(TypeError, parallel_load, partial(connect, sqlite3, DBFILE), "suppliers", [], processes=True)
+
+    def test_parallel_load_process_errors(self):
+        rows = [ Suppliers(sno, "Smith", 20, "London") for sno in range(6, 106) ]
+        for factory, name in [ (connect_locked, "LockedError"), (connect_two_part, "TwoPartError") ]:
+            with self.assertRaises(LoadError) as cm:
+                parallel_load(factory, "suppliers", rows, workers=2, batch_size=10, processes=True)
+            self.assertIsInstance(cm.exception.__cause__, RuntimeError)
+            self.assertIn(name, str(cm.exception.__cause__))
+
+    def test_parallel_load_start_failure(self):
+        started = []
+        real_start = threading.Thread.start
+        def start(thread):
+            if started:
+                raise RuntimeError("can't start new thread")
+            real_start(thread)
+            started.append(thread)
+        with mock.patch.object(threading.Thread, "start", start):
+            self.assertRaises(RuntimeError, parallel_load, connect_e2e, "suppliers", [], workers=3)
+        self.assertFalse(started[0].is_alive())
+
+    def test_parallel_load_lost_connection(self):
+        self.conn.commit()
+        rows = [ Suppliers(sno, "Smith", 20, "London") for sno in range(6, 106) ]
+        rows.append(Suppliers(1, "Duplicate", 20, "London"))
+        factory = partial(connect, sqlite3, DBFILE, timeout=30, factory=LostConnection, check_same_thread=False)
+        with self.assertRaises(LoadError) as cm:
+            parallel_load(factory, "suppliers", rows, workers=2, batch_size=50)
+        self.assertIsInstance(cm.exception.__cause__, sqlite3.IntegrityError)
+
+    def test_insert_returning(self):
+        self.conn.execute("create table parts ( pno integer primary key autoincrement, name text, color text )")
+        self.assertEqual(self.conn.insert_into("parts").from_source({ 'name': "Nut", 'color': "Red" }, returning=True), 1)
+        self.assertEqual(self.conn.insert_into("parts").from_source({ 'name': "Bolt", 'color': "Green" }, returning=[ "pno", "color" ]),
+            (2, "Green"))
+        rows = [ { 'name': f"Screw {i}" } for i in range(5) ]
+        pairs = list(self.conn.insert_into("parts").from_sources_returning(rows, batch_size=2, returning="pno"))
+        self.assertEqual(pairs, list(zip(rows, range(3, 8))))
+        self.assertEqual(self.conn.execute("select name from parts where pno = 7").into1(scalar), "Screw 4")
+
+    def test_prepare_threads(self):
+        self.conn.commit()
+        conn = connect(sqlite3, DBFILE, check_same_thread=False)
+        q = conn.prepare("select name from suppliers where sno = :sno")
+        results = {}
+        def worker(sno):
+            results[sno] = q.into1(scalar, locals())
+        threads = [ threading.Thread(target=worker, args=(sno,)) for sno in range(1, 6) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        conn.close()
+        self.assertEqual(results, { 1: "Smith", 2: "Jones", 3: "Blake", 4: "Clark", 5: "Adams" })
+
+    def test_connect_options(self):
+        cache = QueryCache()
+        conn = connect(sqlite3, DBFILE, timeout=30, cache=cache, rewrite_inserts=True)
+        self.assertIs(conn.query_cache, cache)
+        self.assertTrue(conn.rewrite_inserts)
+        conn.close()
+
+    def test_load_queries(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            Path(tmpdir, "by_city.sql").write_text("select name from suppliers\nwhere city = :city\norder by sno\n")
+            Path(tmpdir, "count.sql").write_text("select count(*) from suppliers")
+            Path(tmpdir, "README").write_text("not a query")
+            for workers in [ None, 2 ]:
+                queries = load_queries(self.conn, tmpdir, workers)
+                self.assertEqual(sorted(queries), [ "by_city", "count" ])
+                self.assertEqual(list(queries.by_city.into(scalar, { 'city': 'Paris' })), [ "Jones", "Blake" ])
+                self.assertEqual(queries["count"]().into1(scalar), 5)
+                self.assertEqual(queries.count.into1(scalar), 5)
+                slow = queries.slow()
+                self.assertEqual(sorted([ x[0] for x in slow ]), [ "by_city", "count" ])
+                self.assertGreaterEqual(slow[0][1], slow[1][1])
+                self.assertEqual(queries.slow(3600.0), [])
+            Path(tmpdir, "bad.sql").write_text("select * from suppliers where sno = $1")
+            with self.assertRaises(SqlError) as cm:
+                load_queries(self.conn, tmpdir)
+            self.assertIn("bad.sql", str(cm.exception))
+            Path(tmpdir, "bad.sql").write_text("select * from suppliers where name = :name and sno = $1")
+            self.assertRaises(SqlError, load_queries, self.conn, tmpdir)
+            Path(tmpdir, "bad.sql").unlink()
+            Path(tmpdir, "accented.sql").write_text("select 'Café' as name", encoding="utf-8")
+            self.assertEqual(load_queries(self.conn, tmpdir).accented().into1(scalar), "Café")
+
     def test_mapping(self):
         curs = self.conn.cursor()
         d = curs.execute("select * from suppliers where sno = 1").into1(mapping)
@@ -101,6 +488,30 @@ class TestEndToEnd(unittest.TestCase):
         self.assertEqual(d['city'], 'London')
         self.assertEqual(len(d), 4)
 
+    def test_targets(self):
+        query = "select * from suppliers where sno < 3 order by sno"
+        expected = [ Suppliers(1, "Smith", 20, "London"), Suppliers(2, "Jones", 10, "Paris") ]
+        self.assertEqual(list(self.conn.execute(query).into(Suppliers)), expected)
+        self.assertEqual(list(self.conn.execute(query).into(SupplierTuple)), [ SupplierTuple(*astuple(x)) for x in expected ])
+        self.assertEqual(list(self.conn.execute(query).into(sequence)), [ astuple(x) for x in expected ])
+        self.assertEqual(list(self.conn.execute(query).into(namespace))[1].city, "Paris")
+        # Columns in another order than the fields.
+        self.assertEqual(list(self.conn.execute("select city, status, name, sno from suppliers where sno < 3 order by sno").into(Suppliers)),
+            expected)
+        # A subclass taking the fields in another order.
+        class Reordered(Suppliers):
+            def __init__(self, city, status, name, sno):
+                super().__init__(sno, name, status, city)
+        self.assertEqual([ astuple(x) for x in self.conn.execute(query).into(Reordered) ], [ astuple(x) for x in expected ])
+        # Unhashable targets are not cached, but work.
+        class Maker:
+            __hash__ = None
+            def __call__(self, **kwargs):
+                return Suppliers(**kwargs)
+        self.assertEqual(list(self.conn.execute(query).into(Maker())), expected)
+        self.assertEqual(list(self.conn.execute("select name from suppliers where sno > 99").into(scalar)), [])
+        self.assertRaises(UnexpectedResultError, list, self.conn.execute(query).into(scalar))
+
 # M a i n   P r o g r a m
 
 if __name__ == '__main__':
@@ -4,14 +4,19 @@
 
 import os, sys
 import unittest
+from unittest import mock
 
 from dataclasses import dataclass
+from types import ModuleType
 
-from abnormal import Connection, Cursor
-from abnormal.driver import StandardDriver, Db2Driver, OracleDriver, Sqlite3Driver
-from abnormal.exceptions import IncompleteDataError, InvalidStateError
+from abnormal import BulkLoadOperation, Connection, Cursor, scalar
+from abnormal.base import RowSchema
+from abnormal.batch import MultiRowInsert, rows_per_statement, simple_insert, SimpleInsert
+from abnormal.driver import driver_for, StandardDriver, Db2Driver, MysqlDriver, OracleDriver, PostgresqlDriver, Sqlite3Driver, SqlServerDriver
+from abnormal.exceptions import IncompleteDataError, InterfaceError, InvalidStateError, NotSupportedError
 
 from dummydb.common import CursorResults, RESULTS, Message, MESSAGE
+import dummydb.bulk
 import dummydb.format
 import dummydb.named
 import dummydb.numeric
@@ -147,7 +152,7 @@ class TestUpdatesInserts(unittest.TestCase):
     def test_insert_sqlite3_like(self):
         conn = Connection(dummydb.qmark.Connection(), dummydb.qmark.paramstyle, Sqlite3Driver())
         curs = conn.cursor()
-        expected_query_1 = "pragma table_info(?)"
+        expected_query_1 = "select * from pragma_table_info(?)"
         needed_data = [
             (0, 'sno', 'TEXT', 1, None, 1),
             (1, 'name', 'TEXT', 1, None, 0),
@@ -182,6 +187,238 @@ class TestUpdatesInserts(unittest.TestCase):
         curs.close()
         conn.close()
 
+    def test_insert_from_sources(self):
+        conn = Connection(dummydb.qmark.Connection(), dummydb.qmark.paramstyle, Sqlite3Driver())
+        curs = conn.cursor()
+        needed_data = [
+            (0, 'sno', 'TEXT', 1, None, 1),
+            (1, 'name', 'TEXT', 1, None, 0),
+            (2, 'status', 'INTEGER', 1, None, 0),
+            (3, 'city', 'TEXT', 1, None, 0)
+        ]
+        RESULTS.execute.append([])
+        RESULTS.fetchone.append(None)
+        for i in reversed(needed_data):
+            RESULTS.fetchone.append(i)
+        RESULTS.description.append([ (x, str, None, None, None, None, None)
+            for x in [ 'cid', 'name', 'type', 'notnull', 'dflt_value', 'pk' ] ])
+        for i in range(3):
+            RESULTS.executemany.append(None)
+        rows = ( Suppliers(sno=f"s{i}", name="Smith", status=20, city="London") for i in range(5) )
+        self.assertEqual(curs.insert_into("suppliers").from_sources(rows, batch_size=2), [ -1, -1, -1 ])
+        executes = [ x for x in MESSAGE if x.source == "cursor execute" ]
+        self.assertEqual(len(executes), 1)
+        self.assertEqual(executes[0].details['operation'], "select * from pragma_table_info(?)")
+        batches = [ x.details for x in MESSAGE if x.source == "cursor executemany" ]
+        params = [ list(x['seq_of_parameters']) for x in batches ]
+        self.assertEqual([ len(x) for x in params ], [ 2, 2, 1 ])
+        self.assertEqual(params[2], [ [ "s4", "Smith", 20, "London" ] ])
+        self.assertEqual(batches[0]['operation'], 'insert into "suppliers" ( "sno", "name", "status", "city" ) values ( ?, ?, ?, ? )')
+        MESSAGE.clear()
+        self.assertEqual(curs.insert_into("suppliers").from_sources([]), [])
+        self.assertFalse(MESSAGE[1:])
+        curs.close()
+        conn.close()
+
+    def test_rows_per_statement(self):
+        self.assertEqual(rows_per_statement(SqlServerDriver(), 4), 524)
+        self.assertEqual(rows_per_statement(SqlServerDriver(), 1), 1000)
+        self.assertEqual(rows_per_statement(SqlServerDriver(), 3000), 1)
+        self.assertEqual(rows_per_statement(Sqlite3Driver(), 100), 327)
+        self.assertEqual(rows_per_statement(MysqlDriver(), 0), 1000)
+        self.assertEqual(rows_per_statement(OracleDriver(), 4), 249)
+        self.assertEqual(rows_per_statement(OracleDriver(), 1, 3), 333)
+        self.assertEqual(rows_per_statement(OracleDriver(), 2000), 1)
+        self.assertIsInstance(driver_for(ModuleType("pymssql")), SqlServerDriver)
+        self.assertIsInstance(driver_for(ModuleType("mysql.connector")), MysqlDriver)
+
+    def test_insert_multirow(self):
+        for driver, expected in [
+                (StandardDriver("table_schema", "database()"),
+                    'insert into "suppliers" ( "sno", "name" ) values ( ?, ? ), ( ?, ? )'),
+                (OracleDriver(),
+                    'insert all into "suppliers" ( "sno", "name" ) values ( ?, ? ) into "suppliers" ( "sno", "name" ) values ( ?, ? ) select 1 from dual') ]:
+            conn = Connection(dummydb.qmark.Connection(), dummydb.qmark.paramstyle, driver)
+            curs = conn.cursor()
+            insert = MultiRowInsert(curs, '"suppliers"', [ '"sno"', '"name"' ], "( :sno, :name )")
+            self.assertEqual(insert.rows, 499 if isinstance(driver, OracleDriver) else 1000)
+            insert.rows = 2
+            for i in range(3):
+                RESULTS.execute.append(None)
+                RESULTS.description.append(None)
+            rows = [ Suppliers(sno=f"s{i}", name=f"n{i}", status=20, city="London") for i in range(5) ]
+            self.assertEqual(insert(rows), -1)
+            executes = [ x.details for x in MESSAGE if x.source == "cursor execute" ]
+            self.assertEqual(len(executes), 3)
+            self.assertEqual(executes[0]['operation'], expected)
+            self.assertEqual(executes[0]['parameters'], [ "s0", "n0", "s1", "n1" ])
+            self.assertEqual(executes[2]['parameters'], [ "s4", "n4" ])
+            MESSAGE.clear()
+            conn.close()
+
+    def test_simple_insert(self):
+        self.assertEqual(simple_insert('insert into s.t ("a", b) values (:a, lower(:b)) -- x'),
+            SimpleInsert('s.t', [ '"a", b' ], '(:a, lower(:b))'))
+        self.assertEqual(simple_insert("INSERT INTO t VALUES (:a, 1);"), SimpleInsert("t", [], "(:a, 1)"))
+        for sql in [
+                "insert into t (a) values (1)",
+                "insert into t (a) values (:a), (:b)",
+                "insert into t (a) select :a",
+                "insert into t (a) values (:a) returning id",
+                "insert into t (a) values (:a) on conflict do nothing",
+                "update t set a = :a" ]:
+            self.assertIsNone(simple_insert(sql), sql)
+
+    def test_rewrite_inserts(self):
+        conn = Connection(dummydb.qmark.Connection(), dummydb.qmark.paramstyle, SqlServerDriver(), rewrite_inserts=True)
+        for i in range(2):
+            RESULTS.execute.append(None)
+            RESULTS.description.append(None)
+        rows = [ { 'a': i, 'b': -i } for i in range(1050) ]
+        conn.executemany("insert into t (a, b) values (:a, :b + :a)", rows)
+        executes = [ x.details for x in MESSAGE if x.source == "cursor execute" ]
+        self.assertEqual(len(executes), 2)
+        self.assertEqual(executes[0]['operation'][:55], "insert into t ( a, b ) values (?, ? + ?), (?, ? + ?), (")
+        self.assertEqual(len(executes[0]['parameters']), 699 * 3)
+        self.assertEqual(executes[1]['parameters'][:3], [ 699, -699, 699 ])
+        MESSAGE.clear()
+        # A chunk size caps the rows in each statement.
+        for i in range(3):
+            RESULTS.execute.append(None)
+            RESULTS.description.append(None)
+        conn.executemany("insert into t (a, b) values (:a, :b + :a)", rows, chunk_size=500)
+        executes = [ x.details for x in MESSAGE if x.source == "cursor execute" ]
+        self.assertEqual([ len(x['parameters']) for x in executes ], [ 1500, 1500, 150 ])
+        MESSAGE.clear()
+        conn.close()
+
+    def test_merge_sql(self):
+        args = ('"t"', [ '"k"' ], [ '"a"', '"b"' ], [ ":k", ":a", ":b" ])
+        self.assertEqual(Sqlite3Driver().merge_into(*args),
+            'insert into "t" ( "k", "a", "b" ) values ( :k, :a, :b ) on conflict ( "k" ) do update set "a" = excluded."a", "b" = excluded."b"')
+        self.assertEqual(PostgresqlDriver().merge_into('"t"', [ '"k"' ], [], [ ":k" ]),
+            'insert into "t" ( "k" ) values ( :k ) on conflict ( "k" ) do nothing')
+        self.assertEqual(MysqlDriver().merge_into(*args),
+            'insert into "t" ( "k", "a", "b" ) values ( :k, :a, :b ) on duplicate key update "a" = values("a"), "b" = values("b")')
+        self.assertEqual(OracleDriver().merge_into(*args),
+            'merge into "t" t using ( select :k "k", :a "a", :b "b" from dual ) s on ( t."k" = s."k" ) '
+            'when matched then update set "a" = s."a", "b" = s."b" '
+            'when not matched then insert ( "k", "a", "b" ) values ( s."k", s."a", s."b" )')
+        self.assertEqual(Db2Driver().merge_into(*args),
+            'merge into "t" as t using ( values ( :k, :a, :b ) ) as s ( "k", "a", "b" ) on ( t."k" = s."k" ) '
+            'when matched then update set "a" = s."a", "b" = s."b" '
+            'when not matched then insert ( "k", "a", "b" ) values ( s."k", s."a", s."b" )')
+        self.assertEqual(SqlServerDriver().merge_into('"t"', [ '"k"', '"l"' ], [], [ ":k", ":l" ]),
+            'merge into "t" with (holdlock) as t using ( values ( :k, :l ) ) as s ( "k", "l" ) on ( t."k" = s."k" and t."l" = s."l" ) '
+            'when not matched then insert ( "k", "l" ) values ( s."k", s."l" );')
+
+    def _bulk_load(self, driver, cursor_class, batch_size=None):
+        conn = Connection(dummydb.bulk.Connection(cursor_class), dummydb.bulk.paramstyle, driver)
+        op = BulkLoadOperation(conn.cursor(), "suppliers")
+        # Spare ourselves the schema lookup.
+        op._row_schema = RowSchema(primary=("sno",), others=("name", "status", "city"))
+        rows = [ Suppliers(sno=f"s{i}", name="Smith", status=20, city="London") for i in range(3) ]
+        rows[1].name = "tab\there"
+        rows[2].city = None
+        result = op.from_sources(rows, batch_size)
+        conn.close()
+        return result, [ x for x in MESSAGE if x.source not in { "connection cursor", "cursor __init__", "connection close" } ]
+
+    def test_bulk_load_copy(self):
+        result, log = self._bulk_load(PostgresqlDriver(), dummydb.bulk.CopyCursor, 2)
+        self.assertEqual(result, [ 2, 1 ])
+        self.assertEqual([ x.source for x in log ], [ "cursor copy", "cursor copy" ])
+        self.assertEqual(log[0].details['statement'], 'copy "suppliers" ( "sno", "name", "status", "city" ) from stdin')
+        self.assertEqual(log[1].details['rows'], [ ("s2", "Smith", 20, None) ])
+
+    def test_bulk_load_infile(self):
+        result, log = self._bulk_load(MysqlDriver(local_infile=True), dummydb.bulk.InfileCursor)
+        self.assertEqual(result, [ 3 ])
+        self.assertEqual(len(log), 1)
+        self.assertRegex(log[0].details['operation'],
+            r"""^load data local infile '[^']+\.tsv' into table "suppliers" character set utf8mb4 \( "sno", "name", "status", "city" \)$""")
+        self.assertEqual(log[0].details['infile'],
+            "s0\tSmith\t20\tLondon\ns1\ttab\\there\t20\tLondon\ns2\tSmith\t20\t\\N\n")
+
+    def test_bulk_load_infile_binary(self):
+        load = MysqlDriver(local_infile=True).bulk_loader(dummydb.bulk.InfileCursor())
+        self.assertEqual(load('"t"', [ '"k"', '"data"' ], [ (1, b"\x00\t\xff"), (2, None), (3, bytearray(b"'")) ]), 3)
+        log = [ x for x in MESSAGE if x.source == "cursor execute" ]
+        self.assertEqual(len(log), 1)
+        self.assertRegex(log[0].details['operation'],
+            r"""^load data local infile '[^']+\.tsv' into table "t" character set utf8mb4 \( "k", @v1 \) set "data" = unhex\(@v1\)$""")
+        self.assertEqual(log[0].details['infile'], "1\t0009ff\n2\t\\N\n3\t27\n")
+        with self.assertRaises(InterfaceError):
+            load('"t"', [ '"data"' ], [ (b"x",), ("x",) ])
+
+    def test_bulk_load_array(self):
+        for driver, cursor_class, params in [
+                (OracleDriver(), dummydb.bulk.ArrayCursor, ":1, :2, :3, :4"),
+                (SqlServerDriver(), dummydb.bulk.FastCursor, "?, ?, ?, ?") ]:
+            result, log = self._bulk_load(driver, cursor_class)
+            self.assertEqual(result, [ 3 ])
+            self.assertEqual(len(log), 1)
+            self.assertEqual(log[0].details['operation'],
+                f'insert into "suppliers" ( "sno", "name", "status", "city" ) values ( {params} )')
+            self.assertEqual(log[0].details['seq_of_parameters'][0], [ "s0", "Smith", 20, "London" ])
+            if cursor_class is dummydb.bulk.FastCursor:
+                self.assertTrue(log[0].details['fast_executemany'])
+            MESSAGE.clear()
+
+    def test_bulk_load_fallback(self):
+        for driver in [ MysqlDriver(), SqlServerDriver(), Sqlite3Driver() ]:
+            RESULTS.executemany.append(None)
+            result, log = self._bulk_load(driver, dummydb.common.Cursor)
+            self.assertEqual(result, [ -1 ])
+            self.assertEqual([ x.source for x in log ], [ "cursor executemany" ])
+            self.assertEqual(log[0].details['operation'],
+                'insert into "suppliers" ( "sno", "name", "status", "city" ) values ( ?, ?, ?, ? )')
+            self.assertEqual(len(list(log[0].details['seq_of_parameters'])), 3)
+            MESSAGE.clear()
+
+    def test_returning_sql(self):
+        args = ('"t"', [ '"a"', '"b"' ], [ ":a", ":b" ], [ '"k"' ])
+        self.assertEqual(Sqlite3Driver().insert_returning(*args), 'insert into "t" ( "a", "b" ) values ( :a, :b ) returning "k"')
+        self.assertEqual(PostgresqlDriver().insert_returning(*args), 'insert into "t" ( "a", "b" ) values ( :a, :b ) returning "k"')
+        self.assertEqual(SqlServerDriver().insert_returning(*args), 'insert into "t" ( "a", "b" ) output inserted."k" values ( :a, :b )')
+        self.assertEqual(Db2Driver().insert_returning(*args), 'select "k" from final table ( insert into "t" ( "a", "b" ) values ( :a, :b ) )')
+        self.assertEqual(OracleDriver().insert_returning(*args), 'insert into "t" ( "a", "b" ) values ( :a, :b )')
+        self.assertRaises(NotSupportedError, MysqlDriver().insert_returning, *args)
+
+    def _insert_returning(self, driver, paramstyle, cursor_class, returning):
+        conn = Connection(dummydb.bulk.Connection(cursor_class), paramstyle, driver)
+        op = conn.insert_into("suppliers")
+        op._row_schema = RowSchema(primary=("sno",), others=("name", "status", "city"))
+        rows = [ { 'name': f"n{i}", 'status': i, 'city': "London" } for i in range(3) ]
+        result = list(op.from_sources_returning(rows, returning=returning))
+        self.assertEqual([ x[0] for x in result ], rows)
+        conn.close()
+        return [ x[1] for x in result ], [ x.details for x in MESSAGE if x.source == "cursor executemany" ]
+
+    def test_returning_nothing(self):
+        conn = Connection(dummydb.bulk.Connection(dummydb.bulk.PipelineCursor), "pyformat", PostgresqlDriver())
+        for primary, returning in [ ((), True), (("sno",), []) ]:
+            op = conn.insert_into("suppliers")
+            op._row_schema = RowSchema(primary=primary, others=("name", "status", "city"))
+            with self.assertRaisesRegex(ValueError, "suppliers"):
+                list(op.from_sources_returning([ { 'name': "n", 'status': 1, 'city': "London" } ], returning=returning))
+        conn.close()
+
+    def test_returning_oracle(self):
+        keys, log = self._insert_returning(OracleDriver(), "named", dummydb.bulk.ReturningCursor, True)
+        self.assertEqual(keys, [ 100, 101, 102 ])
+        self.assertEqual(log[0]['operation'],
+            'insert into "suppliers" ( "name", "status", "city" ) values ( :name, :status, :city ) returning "sno" into :abnormal_r0')
+        self.assertEqual(len(log[0]['seq_of_parameters']), 3)
+
+    def test_returning_postgres(self):
+        keys, log = self._insert_returning(PostgresqlDriver(), "pyformat", dummydb.bulk.PipelineCursor, [ "status", "city" ])
+        self.assertEqual(keys, [ (0, "London"), (1, "London"), (2, "London") ])
+        self.assertEqual(len(log), 1)
+        self.assertTrue(log[0]['returning'])
+        self.assertEqual(log[0]['operation'],
+            'insert into "suppliers" ( "name", "status", "city" ) values ( %(name)s, %(status)s, %(city)s ) returning "status", "city"')
+
     def test_insert_numeric(self):
         conn = Connection(dummydb.numeric.Connection(), dummydb.numeric.paramstyle, StandardDriver("table_schema", "database()"))
         curs = conn.cursor()
@@ -648,6 +885,75 @@ class TestUpdatesInserts(unittest.TestCase):
         curs.close()
         conn.close()
 
+    def test_prepare_postgres(self):
+        conn = Connection(dummydb.pyformat.Connection(), dummydb.pyformat.paramstyle, PostgresqlDriver())
+        q = conn.prepare("select * from suppliers where sno = :sno")
+        for i in range(2):
+            RESULTS.execute.append([])
+            RESULTS.description.append(None)
+            q.execute(DATA_SOURCE)
+            msg = MESSAGE.pop()
+            while msg.source != "cursor execute":
+                msg = MESSAGE.pop()
+            self.assertEqual(msg.details['operation'], "select * from suppliers where sno = %(sno)s")
+            self.assertEqual(msg.details['parameters'], { 'sno': 's1' })
+            self.assertTrue(msg.details['prepare'])
+        conn.close()
+
+    def test_executemany_chunks(self):
+        conn = Connection(dummydb.qmark.Connection(), dummydb.qmark.paramstyle, StandardDriver("table_schema", "database()"))
+        curs = conn.cursor()
+        query = "insert into suppliers (sno, name) values (:sno, :name)"
+        rows = ( Suppliers(sno=f"s{i}", name="Smith", status=20, city="London") for i in range(5) )
+        for i in range(3):
+            RESULTS.executemany.append(None)
+        curs.executemany(query, rows, chunk_size=2)
+        chunks = [ x.details['seq_of_parameters'] for x in MESSAGE if x.source == "cursor executemany" ]
+        self.assertEqual([ len(x) for x in chunks ], [ 2, 2, 1 ])
+        self.assertEqual(list(chunks[2]), [ [ "s4", "Smith" ] ])
+        MESSAGE.clear()
+        # Without a chunk size, connectors wanting lists get a default one.
+        with mock.patch("abnormal._CHUNK_SIZE", 3):
+            for i in range(2):
+                RESULTS.executemany.append(None)
+            curs.executemany(query, ( DATA_SOURCE for i in range(5) ))
+        chunks = [ x.details['seq_of_parameters'] for x in MESSAGE if x.source == "cursor executemany" ]
+        self.assertEqual([ len(x) for x in chunks ], [ 3, 2 ])
+        MESSAGE.clear()
+        curs.executemany(query, iter([]))
+        curs.executemany(query, iter([]), chunk_size=2)
+        self.assertFalse([ x for x in MESSAGE if x.source == "cursor executemany" ])
+        self.assertRaises(ValueError, curs.executemany, query, [ DATA_SOURCE ], 0)
+        conn.close()
+
+    def test_executemany_lazy(self):
+        for driver, lazy in [ (StandardDriver("table_schema", "database()"), False), (Sqlite3Driver(), True) ]:
+            conn = Connection(dummydb.qmark.Connection(), dummydb.qmark.paramstyle, driver)
+            RESULTS.executemany.append(None)
+            conn.executemany("insert into suppliers (sno) values (:sno)", ( DATA_SOURCE for i in range(3) ))
+            msg = MESSAGE.pop()
+            while msg.source != "cursor executemany":
+                msg = MESSAGE.pop()
+            self.assertEqual(isinstance(msg.details['seq_of_parameters'], list), not lazy)
+            self.assertEqual(list(msg.details['seq_of_parameters']), [ [ "s1" ] ] * 3)
+            conn.close()
+
+    def test_into_batches(self):
+        conn = Connection(dummydb.qmark.Connection(), dummydb.qmark.paramstyle, Sqlite3Driver())
+        RESULTS.execute.append(None)
+        RESULTS.description.append([ ('sno', str, None, None, None, None, None) ])
+        RESULTS.fetchone.append(None)
+        for i in reversed(range(10)):
+            RESULTS.fetchone.append((f"s{i}",))
+        curs = conn.execute("select sno from suppliers")
+        batches = list(curs.into_batches(scalar))
+        self.assertEqual([ len(x) for x in batches ], [ 1, 2, 4, 3 ])
+        self.assertEqual(batches[3], [ "s7", "s8", "s9" ])
+        sizes = [ x.details['size'] for x in MESSAGE if x.source == "cursor fetchmany" ]
+        self.assertEqual(sizes, [ 1, 2, 4, 8, 8 ])
+        self.assertRaises(ValueError, next, curs.into_batches(scalar, 0))
+        conn.close()
+
 # M a i n   P r o g r a m
 
 if __name__ == '__main__':